@@ -248,6 +248,30 @@ class RecurrentMaskableActorCriticPolicy(ActorCriticPolicy):
         :param action_masks: Action masks to apply to the action distribution
         :return: action, value and log probability of the action
         """
+        distribution, values, lstm_states = self.get_distribution_and_values(
+            obs, lstm_states, episode_starts, action_masks
+        )
+        actions = distribution.get_actions(deterministic=deterministic)
+        log_prob = distribution.log_prob(actions)
+        return actions, values, log_prob, lstm_states
+
+    def get_distribution_and_values(
+        self,
+        obs: th.Tensor,
+        lstm_states: RNNStates,
+        episode_starts: th.Tensor,
+        action_masks: Optional[np.ndarray] = None,
+    ) -> Tuple[MaskableDistribution, th.Tensor, RNNStates]:
+        """
+        Forward pass in all the networks (actor and critic), without sampling an action
+
+        :param obs: Observation.
+        :param lstm_states: The last hidden and memory states for the LSTM.
+        :param episode_starts: Whether the observations correspond to new episodes
+            or not (we reset the lstm states in that case).
+        :param action_masks: Action masks to apply to the action distribution
+        :return: the action distribution, the estimated values and the new hidden states.
+        """
         # Preprocess the observation if needed
         features = self.extract_features(obs)
         if self.share_features_extractor:
@@ -274,9 +298,7 @@ class RecurrentMaskableActorCriticPolicy(ActorCriticPolicy):
         distribution = self._get_action_dist_from_latent(latent_pi)
         if action_masks is not None:
             distribution.apply_masking(action_masks)
-        actions = distribution.get_actions(deterministic=deterministic)
-        log_prob = distribution.log_prob(actions)
-        return actions, values, log_prob, RNNStates(lstm_states_pi, lstm_states_vf)
+        return distribution, values, RNNStates(lstm_states_pi, lstm_states_vf)
 
     def _get_action_dist_from_latent(self, latent_pi: th.Tensor) -> MaskableDistribution:
         """
@@ -56,9 +56,7 @@ class RegicideCustomEnv(gym.Env):
             return observation, -1, False, {}
 
     def action_masks(self):
-        legal_moves = self.env.state.legal_moves()
-        legal_moves_as_int = self.env.state.legal_moves_as_int()
-        return [action in legal_moves_as_int for action in self.possible_actions]
+        return self.env.state.legal_action_mask()
 
     def render(self, mode='human'):
         self.env.render(mode=mode)
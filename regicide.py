@@ -16,10 +16,16 @@
 import os
 import math
 import enum
+import itertools
+
+import numpy as np
 
 from regicide_desk import RegicideDisacrdDesk, RegicideDrawDesk, RegicideEnemyDesk
+from regicide_card import card_table
 from regicide_hand import RegicideHand
-from regicide_move import RegicideMoveType, RegicideMove, RegicideMoveGenerator
+from regicide_discard import get_discard_resolver
+from regicide_hash import RegicideZobrist
+from regicide_move import RegicideMoveType, RegicideMove, RegicideMoveGenerator, move_table
 
 COMBO_LIST = [1, 4, 6, 4, 1]
 # COMBO_LIST_color = [[], \
@@ -28,6 +34,77 @@ COMBO_LIST = [1, 4, 6, 4, 1]
 #                     [0,1,2], [0,1,3], [0,2,3], [1,2,3],
 #                     [0,1,2,3]]
 
+# Seeds the bit generators of copy_rng(), whose state is overwritten right away.
+_COPY_SEED = np.random.SeedSequence(0)
+
+def copy_rng(rng):
+    """Returns a new numpy random Generator in the same state as rng."""
+    # Seeding from a SeedSequence and setting the state is about twice as
+    # fast as copy.copy(), which goes through pickling.
+    bit_generator = type(rng.bit_generator)(_COPY_SEED)
+    bit_generator.state = rng.bit_generator.state
+    return np.random.Generator(bit_generator)
+
+# Value of RegicideState.cur_player() while a chance node is pending.
+CHANCE_PLAYER_ID = -1
+
+# Version tag of the RegicideState binary layout, see RegicideGame.state_dtype().
+STATE_FORMAT = 1
+
+def pack_states(states, out=None):
+    """Packs states into one contiguous structured array.
+
+    Args:
+        states: a sequence of RegicideState of the same game.
+        out: an optional array of the game's state_dtype() with one record
+          per state, to fill instead of allocating a new one.
+
+    Returns:
+        The array of records; out.tobytes() is the concatenation of the
+        states' to_bytes().
+    """
+    if out is None:
+        out = np.zeros(len(states), dtype=states[0]._game.state_dtype())
+    for record, state in zip(out, states):
+        state._pack(record)
+    return out
+
+def pack_aggregates(states, out=None):
+    """Packs the hashes and running totals of states, see RegicideGame.aggregate_dtype().
+
+    Args:
+        states: a sequence of RegicideState of the same game.
+        out: an optional array of the game's aggregate_dtype() with one
+          record per state, to fill instead of allocating a new one.
+    """
+    if out is None:
+        out = np.zeros(len(states), dtype=states[0]._game.aggregate_dtype())
+    for record, state in zip(out, states):
+        state._pack_aggregates(record)
+    return out
+
+def unpack_states(game, records, aggregates=None):
+    """Returns the list of RegicideState stored in an array of records.
+
+    Args:
+        game: the RegicideGame the states were packed from.
+        records: an array of game.state_dtype(), or bytes holding such records.
+        aggregates: an optional array of game.aggregate_dtype() written by
+          pack_aggregates() for the same states. The hashes and running
+          totals are then copied from it instead of being recomputed.
+    """
+    dtype = game.state_dtype()
+    if isinstance(records, (bytes, bytearray, memoryview)):
+        if len(records) % dtype.itemsize != 0:
+            raise ValueError("%d bytes is not a whole number of %d-byte states."
+                             % (len(records), dtype.itemsize))
+        records = np.frombuffer(records, dtype=dtype)
+    if records.dtype != dtype:
+        raise ValueError("The records do not have the state layout of the game.")
+    if aggregates is None:
+        return [RegicideState._unpack(game, record) for record in records]
+    return [RegicideState._unpack(game, record, aggregate) for record, aggregate in zip(records, aggregates)]
+
 class RegicideStateType(enum.IntEnum):
     """Move types."""
     INVALID = 0
@@ -36,6 +113,116 @@ class RegicideStateType(enum.IntEnum):
     WIN = 3
     LOSS = 4
 
+class RegicideUndoOp(enum.IntEnum):
+    """Primitive changes recorded in a RegicideUndoRecord."""
+    HAND_POP = 0
+    HAND_DRAW = 1
+    DISCARD_PLACE = 2
+    DISCARD_TO_DRAW = 3
+    DRAW_INSERT = 4
+    ENEMY_DEAL = 5
+    ENEMY_HEALTH = 6
+    ENEMY_ATTACK = 7
+    ENEMY_ENCODING = 8
+
+class RegicideUndoRecord(object):
+    """Changes made by one RegicideState.apply_move call.
+
+    The record holds the scalar fields as they were before the move and the
+    list of primitive card and enemy changes, including the cards the heart
+    effect picked at random, so RegicideState.undo_move can revert them. The
+    state's random Generator state is only saved when the move consumed it.
+    """
+
+    def __init__(self, demage, cur_state, reward, chance=None, draw_known=(0, 0)):
+        self._demage = demage
+        self._cur_state = cur_state
+        self._reward = reward
+        self._chance = chance
+        self._draw_known = draw_known
+        self._rng_state = None
+        self._ops = []
+
+    def append(self, op, a=None, b=None):
+        self._ops.append((op, a, b))
+
+    def ops(self):
+        """Returns the recorded (op, a, b) tuples, oldest first."""
+        return self._ops
+
+    def __len__(self):
+        return len(self._ops)
+
+class RegicideChanceType(enum.IntEnum):
+    """Chance node types."""
+    HEART = 1
+
+class RegicideChanceNode(object):
+    """A random event a RegicideState stopped at, see RegicideState.apply_move.
+
+    For HEART, count distinct cards are picked uniformly at random from the
+    discard pile and placed, in pick order, at the bottom of the draw pile.
+    An outcome is the tuple of the picked card keys in pick order, and every
+    outcome is equally likely.
+    """
+
+    def __init__(self, chance_type, count, card_ids, continuation):
+        self._chance_type = chance_type
+        self._count = count
+        self._card_ids = tuple(card_ids)
+        self._positions = {card_id: i for i, card_id in enumerate(self._card_ids)}
+        self._continuation = continuation
+
+    def type(self):
+        return self._chance_type
+
+    def count(self):
+        """Returns the number of cards picked."""
+        return self._count
+
+    def card_ids(self):
+        """Returns the card keys that can be picked, in discard pile order."""
+        return self._card_ids
+
+    def num_outcomes(self):
+        return math.perm(len(self._card_ids), self._count)
+
+    def probability(self, outcome):
+        """Returns the probability of an outcome, 0 if it is not possible."""
+        try:
+            self.indices(outcome)
+        except ValueError:
+            return 0.0
+        return 1.0 / self.num_outcomes()
+
+    def outcomes(self):
+        """Yields every outcome; there are num_outcomes() of them."""
+        return itertools.permutations(self._card_ids, self._count)
+
+    def sample(self, rng):
+        """Returns an outcome drawn with the numpy random Generator rng.
+
+        The draw is the one the state makes when it does not stop at the
+        chance node, so the same Generator state gives the same outcome.
+        """
+        indices = rng.choice(len(self._card_ids), self._count, replace=False)
+        return tuple(self._card_ids[i] for i in indices)
+
+    def indices(self, outcome):
+        """Returns the discard pile positions of the cards of an outcome."""
+        outcome = tuple(int(card_id) for card_id in outcome)
+        if len(outcome) != self._count or len(set(outcome)) != self._count:
+            raise ValueError("An outcome is %d distinct cards, got %s." % (self._count, outcome))
+        if any(card_id not in self._positions for card_id in outcome):
+            raise ValueError("%s are not all in the discard pile." % (outcome,))
+        return np.array([self._positions[card_id] for card_id in outcome], dtype=np.intp)
+
+    def __str__(self):
+        return "%s.%d of %d" % (self._chance_type, self._count, len(self._card_ids))
+
+    def __repr__(self):
+        return self.__str__()
+
 class RegicideState(object):
     """Current environment state for an active Regicide game.
 
@@ -44,25 +231,303 @@ class RegicideState(object):
     by cur_player() returning CHANCE_PLAYER_ID).
     """
 
-    def __init__(self, game):
+    def __init__(self, game, rng=None):
+        """Deals a new game.
+
+        Args:
+            game: the RegicideGame being played.
+            rng: the numpy random Generator of this game, which shuffles the
+              desks and draws the heart effect cards. Defaults to the next
+              episode's Generator of the game, see RegicideGame.new_rng().
+        """
         self._game = game
-        self._desk = RegicideDrawDesk(game)
-        self._discard_desk = RegicideDisacrdDesk(game)
-        self._enemy_desk = RegicideEnemyDesk(game)
-        self._hands = [RegicideHand(game, self._desk, self._discard_desk) 
-                       for _ in range(game.num_players())]
+        self._rng = rng if rng is not None else game.new_rng()
+        self._desk = RegicideDrawDesk(game, self._rng)
+        self._discard_desk = RegicideDisacrdDesk(game, self._rng)
+        self._enemy_desk = RegicideEnemyDesk(game, self._rng)
+        # Number of full hands, shared with and kept up to date by the hands.
+        self._full_hands = [0]
+        self._hands = [RegicideHand(game, self._desk, self._discard_desk, player, self._full_hands)
+                       for player in range(game.num_players())]
         for hand in self._hands:
             hand.sort()
-        self._RegicideMoveGenerator = RegicideMoveGenerator(self._game.num_colors(), self._game.num_ranks())
 
         self._cur_player = 0
         self._demage = 0
         self._cur_state = RegicideStateType.PLAY
         self._num_players = game.num_players()
-        self._moves = self.all_moves()
+        self._moves = game.move_table().moves()
         self._maximum_score = self._enemy_desk.total_health()
-        self._enemy_encoding = [1 for _ in range(self._game.enemy_size())]
+        self._enemy_encoding = self._game.initial_enemy_encoding()
         self._reward = 0
+        self._version = 0
+        self._legal_version = -1
+        self._legal_cache = None
+        self._undo_record = None
+        self._chance = None
+        self._discard_resolver = None
+
+    def clone(self):
+        """Returns an independent copy of the state for search and rollouts.
+
+        The game, move table and card objects are shared with the copy; only
+        the desks, hands and small per-state containers are copied.
+        """
+        # A plain __dict__ copy skips the copy.copy() dispatch.
+        state = object.__new__(type(self))
+        state.__dict__.update(self.__dict__)
+        state._rng = copy_rng(self._rng)
+        state._desk = self._desk.clone(state._rng)
+        state._discard_desk = self._discard_desk.clone(state._rng)
+        state._enemy_desk = self._enemy_desk.clone(state._rng)
+        state._full_hands = list(self._full_hands)
+        state._hands = [hand.clone(state._desk, state._discard_desk, state._full_hands)
+                        for hand in self._hands]
+        state._enemy_encoding = list(self._enemy_encoding)
+        return state
+
+    def to_bytes(self):
+        """Returns the state in the fixed binary layout of game.state_dtype().
+
+        The encoding holds every pile and hand, the enemies' health and
+        attack, the damage, state type, reward, enemy encoding and the state
+        of the random Generator, so from_bytes() restores a state that plays
+        on exactly like this one. Undo records are not part of the state.
+        """
+        return pack_states([self]).tobytes()
+
+    @classmethod
+    def from_bytes(cls, game, data):
+        """Returns the state encoded by to_bytes() for the same game configuration."""
+        if len(data) != game.state_dtype().itemsize:
+            raise ValueError("Expected %d bytes, got %d." % (game.state_dtype().itemsize, len(data)))
+        return unpack_states(game, data)[0]
+
+    @classmethod
+    def from_deal(cls, game, draw_ids, enemy_ids, seed):
+        """Returns a new game dealt from a given shuffle instead of a random one.
+
+        Args:
+            game: the RegicideGame being played.
+            draw_ids: the card keys of the shuffled draw pile, from the top,
+              before the hands are dealt.
+            enemy_ids: the enemy keys of the enemy desk, from the top.
+            seed: the seed of the state's random Generator, which draws the
+              heart effect cards.
+        """
+        state = game._template_state().clone()
+        state._rng.bit_generator.state = np.random.PCG64(seed).state
+        draw_ids = np.asarray(draw_ids, dtype=np.int8)
+        dealt = 0
+        for hand in state._hands:
+            bits = 0
+            for card_id in draw_ids[dealt:dealt + game.hand_size()].tolist():
+                bits |= 1 << card_id
+            hand._set_bits(bits)
+            dealt += game.hand_size()
+        state._desk._set_ids(draw_ids[dealt:])
+        enemy_ids = np.asarray(enemy_ids, dtype=np.intp)
+        levels = enemy_ids % game.num_ranks() - 10
+        state._enemy_desk.set_enemies(enemy_ids, np.asarray(game.enemy_health())[levels],
+                                      np.asarray(game.enemy_attack())[levels])
+        state._maximum_score = state._enemy_desk.total_health()
+        state._version += 1
+        return state
+
+    def _pack(self, record):
+        """Writes the state into a record of game.state_dtype()."""
+        if self._chance is not None:
+            raise ValueError("States at a chance node cannot be serialized.")
+        draw_ids = self._desk.ids()
+        discard_ids = self._discard_desk.ids()
+        enemy_ids = self._enemy_desk.ids()
+        record['format'] = STATE_FORMAT
+        record['hands'] = [hand.bits() for hand in self._hands]
+        record['draw_len'] = len(draw_ids)
+        record['draw'][:len(draw_ids)] = draw_ids
+        record['draw_known'] = self._desk.known()
+        record['discard_len'] = len(discard_ids)
+        record['discard'][:len(discard_ids)] = discard_ids
+        record['enemy_len'] = len(enemy_ids)
+        record['enemy'][:len(enemy_ids)] = enemy_ids
+        record['enemy_health'][:len(enemy_ids)] = self._enemy_desk.healths(enemy_ids)
+        record['enemy_attack'][:len(enemy_ids)] = self._enemy_desk.attacks(enemy_ids)
+        record['enemy_encoding'] = self._enemy_encoding
+        record['demage'] = self._demage
+        record['cur_state'] = self._cur_state
+        record['cur_player'] = self._cur_player
+        record['reward'] = self._reward
+        rng_state = self._rng.bit_generator.state
+        if rng_state['bit_generator'] != 'PCG64':
+            raise ValueError("Only PCG64 random Generators can be serialized.")
+        for field in ('state', 'inc'):
+            value = rng_state['state'][field]
+            record['rng_' + field] = [value & 0xFFFFFFFFFFFFFFFF, value >> 64]
+        record['rng_has_uint32'] = rng_state['has_uint32']
+        record['rng_uinteger'] = rng_state['uinteger']
+
+    def _pack_aggregates(self, record):
+        """Writes the hashes and running totals into a record of game.aggregate_dtype()."""
+        record['draw_hash'] = self._desk.hash()
+        record['discard_hash'] = self._discard_desk.hash()
+        record['enemy_hash'] = self._enemy_desk._hash
+        record['enemy_stats_hash'] = self._enemy_desk._stats_hash
+        for player, hand in enumerate(self._hands):
+            card_set = hand.card_set()
+            record['hand_size'][player] = len(card_set)
+            record['hand_hash'][player] = hand.hash()
+            record['hand_value'][player] = hand.total_value()
+            record['rank_counts'][player] = [card_set.rank_count(rank) for rank in range(self._game.num_ranks())]
+            record['color_counts'][player] = [card_set.color_count(color)
+                                              for color in range(self._game.num_colors())]
+
+    @classmethod
+    def _unpack(cls, game, record, aggregate=None):
+        """Returns the state stored in a record of game.state_dtype().
+
+        With a record of game.aggregate_dtype() for the same state, the
+        piles and hands are copied in without recomputing any hash or total.
+        """
+        if record['format'] != STATE_FORMAT:
+            raise ValueError("Unsupported state format %d." % record['format'])
+        state = game._template_state().clone()
+        rng = state._rng
+        draw_len = int(record['draw_len'])
+        discard_len = int(record['discard_len'])
+        enemy_len = int(record['enemy_len'])
+        if aggregate is None:
+            state._desk._set_ids(record['draw'][:draw_len])
+            state._discard_desk._set_ids(record['discard'][:discard_len])
+            state._enemy_desk.set_enemies(record['enemy'][:enemy_len], record['enemy_health'][:enemy_len],
+                                          record['enemy_attack'][:enemy_len])
+            for hand, bits in zip(state._hands, record['hands'].tolist()):
+                hand._set_bits(bits)
+        else:
+            state._desk._load_ids(record['draw'][:draw_len], int(aggregate['draw_hash']))
+            state._discard_desk._load_ids(record['discard'][:discard_len], int(aggregate['discard_hash']))
+            state._enemy_desk.load_enemies(record['enemy'][:enemy_len], record['enemy_health'][:enemy_len],
+                                           record['enemy_attack'][:enemy_len], int(aggregate['enemy_hash']),
+                                           int(aggregate['enemy_stats_hash']))
+            sizes = aggregate['hand_size'].tolist()
+            for hand, bits, size, hash, value, rank_counts, color_counts in zip(
+                    state._hands, record['hands'].tolist(), sizes, aggregate['hand_hash'].tolist(),
+                    aggregate['hand_value'].tolist(), aggregate['rank_counts'].tolist(),
+                    aggregate['color_counts'].tolist()):
+                hand._load(bits, size, hash, value, rank_counts, color_counts)
+            state._full_hands[0] = sizes.count(game.hand_size())
+        state._desk.set_known(*record['draw_known'].tolist())
+        state._enemy_encoding = record['enemy_encoding'].tolist()
+        state._demage = int(record['demage'])
+        state._cur_state = RegicideStateType(int(record['cur_state']))
+        state._cur_player = int(record['cur_player'])
+        state._reward = float(record['reward'])
+        rng_state, rng_inc = (record['rng_state'].tolist(), record['rng_inc'].tolist())
+        rng.bit_generator.state = {
+            'bit_generator': 'PCG64',
+            'state': {'state': rng_state[0] | rng_state[1] << 64, 'inc': rng_inc[0] | rng_inc[1] << 64},
+            'has_uint32': int(record['rng_has_uint32']),
+            'uinteger': int(record['rng_uinteger'])}
+        state._version += 1
+        return state
+
+    def sample_determinizations(self, n, player=None, seed=None, shuffle_enemies=True, out=None):
+        """Samples n full states consistent with what player has observed.
+
+        The player sees their own hand, the discard pile, the current enemy
+        and the cards put face up on the draw pile (see
+        RegicideDrawDesk.known()). The unseen cards of the draw pile and the
+        other players' hands are dealt again at random, keeping every pile
+        and hand size, and the enemies behind the current one are shuffled
+        within their rank. The cards a heart put at the bottom of the draw
+        pile are known but not their order, so they are shuffled among
+        themselves. Each sample gets its own random Generator state.
+
+        Args:
+            n: an integer, the number of states to sample.
+            player: the observing player, defaults to the current player.
+            seed: an optional seed of the sampler.
+            shuffle_enemies: bool, whether the enemy order is unseen.
+            out: an optional array of n records of game.state_dtype() to
+              write the samples into.
+
+        Returns:
+            An array of n records of game.state_dtype(); see unpack_states()
+            and RegicideBatchState.from_records().
+        """
+        if player is None:
+            player = self._cur_player
+        rng = np.random.default_rng(seed)
+        records = out if out is not None else np.empty(n, dtype=self._game.state_dtype())
+        records[:] = pack_states([self])[0]
+
+        draw_ids = self._desk.ids()
+        known_top, known_bottom = self._desk.known()
+        unseen_end = len(draw_ids) - known_bottom
+        hidden = [p for p in range(self._num_players) if p != player]
+        pool = np.concatenate([draw_ids[known_top:unseen_end]] +
+                              [np.fromiter(self._hands[p].card_set(), dtype=np.int8) for p in hidden])
+        pool = pool[rng.random((n, len(pool))).argsort(axis=1)]
+        records['draw'][:, known_top:unseen_end] = pool[:, :unseen_end - known_top]
+        offset = unseen_end - known_top
+        for p in hidden:
+            cards = pool[:, offset:offset + len(self._hands[p])].astype(np.uint64)
+            records['hands'][:, p] = np.bitwise_or.reduce(np.uint64(1) << cards, axis=1)
+            offset += len(self._hands[p])
+        if known_bottom:
+            order = rng.random((n, known_bottom)).argsort(axis=1)
+            records['draw'][:, unseen_end:len(draw_ids)] = draw_ids[unseen_end:][order]
+
+        if shuffle_enemies:
+            enemy_ids = self._enemy_desk.ids()
+            ranks = enemy_ids % self._game.num_ranks()
+            for rank in np.unique(ranks[1:]):
+                positions = np.flatnonzero(ranks == rank)
+                positions = positions[positions > 0]
+                order = rng.random((n, len(positions))).argsort(axis=1)
+                records['enemy'][:, positions] = enemy_ids[positions][order]
+
+        records['rng_state'] = rng.integers(0, 1 << 64, size=(n, 2), dtype=np.uint64, endpoint=False)
+        records['rng_inc'] = rng.integers(0, 1 << 64, size=(n, 2), dtype=np.uint64, endpoint=False)
+        records['rng_inc'][:, 0] |= np.uint64(1)
+        records['rng_has_uint32'] = 0
+        records['rng_uinteger'] = 0
+        return records
+
+    def state_hash(self):
+        """Returns a 64-bit Zobrist-style hash of the state.
+
+        The hash covers every hand, the order of the draw pile, the set of
+        discarded cards, the order of the enemy desk with each enemy's health
+        and attack, the damage to discard, the state type and the current
+        player. The pile and hand hashes are updated by the desks and hands
+        as cards move, so this is O(num_players). Equal states always hash
+        equal; use canonical_key() where collisions are not acceptable.
+        """
+        zobrist = self._game.zobrist()
+        value = self._desk.hash() ^ self._discard_desk.hash() ^ self._enemy_desk.hash()
+        for hand in self._hands:
+            value ^= hand.hash()
+        return (value ^ zobrist.scalar(1, self._demage) ^ zobrist.scalar(2, int(self._cur_state)) ^
+                zobrist.scalar(3, self._cur_player))
+
+    def canonical_key(self):
+        """Returns the same content as state_hash() as an exact bytes key.
+
+        The key holds each hand and the discard pile as 8-byte bitmasks, the
+        draw pile and enemy desk as card keys from the top, each enemy's
+        health and attack, and the damage, state type and current player.
+        """
+        enemy_ids = self._enemy_desk.ids()
+        parts = [hand.bits().to_bytes(8, 'little') for hand in self._hands]
+        parts.append(np.array([len(self._desk)], dtype=np.int16).tobytes())
+        parts.append(self._desk.ids().astype(np.int8).tobytes())
+        parts.append(self._discard_desk.bits().to_bytes(8, 'little'))
+        parts.append(np.array([len(enemy_ids)], dtype=np.int16).tobytes())
+        parts.append(enemy_ids.astype(np.int8).tobytes())
+        parts.append(self._enemy_desk.healths(enemy_ids).tobytes())
+        parts.append(self._enemy_desk.attacks(enemy_ids).tobytes())
+        parts.append(np.array([self._demage, self._cur_state, self._cur_player], dtype=np.int16).tobytes())
+        return b"".join(parts)
 
     def is_terminal(self):
         """Returns false if game is still active, true otherwise."""
@@ -79,13 +544,27 @@ class RegicideState(object):
     def cur_state(self):
         return self._cur_state
 
+    def demage(self):
+        """Returns the damage left to discard in the DISCARD phase, 0 otherwise."""
+        return self._demage
+
     def cur_player(self):
         """Returns index of next player to act.
 
         Index will be CHANCE_PLAYER_ID if a chance event needs to be resolved.
         """
+        if self._chance is not None:
+            return CHANCE_PLAYER_ID
         return self._cur_player
 
+    def is_chance_node(self):
+        """Returns true if the state stopped at a chance node, see apply_move."""
+        return self._chance is not None
+
+    def chance_node(self):
+        """Returns the pending RegicideChanceNode, or None."""
+        return self._chance
+
     def deck_size(self):
         """Returns number of cards left in the deck."""
         return len(self._desk)
@@ -143,85 +622,254 @@ class RegicideState(object):
         return hand_list
 
     def player_hands_full(self):
-        for hand in self._hands:
-            if not hand.full():
-                return False
-        return True
+        return self._full_hands[0] == self._num_players
+
+    def total_enemy_health(self):
+        """Returns the total health of the enemies left."""
+        return self._enemy_desk.total_health()
 
     def end_of_game_status(self):
         """Returns the end of game status, NOT_FINISHED if game is still active."""
         return None
 
     def get_move(self, move_id):
-        move = self._RegicideMoveGenerator.generate(move_id)
-        # move = RegicideMove(move_id, self._game.hand_size())
-        return move
+        """Returns the shared move object of a move id."""
+        return self._moves[move_id]
     
-    def apply_move(self, move):
+    def version(self):
+        """Returns a counter that is bumped every time the state changes."""
+        return self._version
+
+    def _log(self, op, a=None, b=None):
+        """Records a primitive change if an undo record is being built."""
+        if self._undo_record is not None:
+            self._undo_record.append(op, a, b)
+
+    def _pop_hand_card(self, card_info):
+        card = self.cur_player_hand().pop_card_in_hand(card_info)
+        self._log(RegicideUndoOp.HAND_POP, self._cur_player, card)
+        return card
+
+    def _place_discard(self, card):
+        self._discard_desk.placecard(card)
+        self._log(RegicideUndoOp.DISCARD_PLACE)
+
+    def apply_move(self, move, undo=False, stop_at_chance=False):
+        """Applies a legal move for the current player.
+
+        Args:
+            move: a legal RegicideMove.
+            undo: bool, whether to record the changes made by the move.
+            stop_at_chance: bool, if True and the move triggers a heart effect
+              that picks random cards, the state stops at a chance node
+              instead of picking them. The rest of the move is played by
+              apply_chance().
+
+        Returns:
+            a RegicideUndoRecord to pass to undo_move() if undo is True,
+            None otherwise.
+        """
         assert self.move_is_legal(move)
-        self._reward = 0
-        if move.type() == RegicideMoveType.PLAY:
+        record = None
+        if undo:
+            record = RegicideUndoRecord(self._demage, self._cur_state, self._reward, self._chance,
+                                        self._desk.known())
+        self._undo_record = record
+        try:
+            self._apply_move(move, stop_at_chance)
+            self._resolve_discard()
+        finally:
+            self._undo_record = None
+        return record
+
+    def set_discard_resolver(self, resolver):
+        """Sets how the DISCARD phase is resolved.
+
+        With a resolver, a move that leads to the DISCARD phase also discards
+        the cards the resolver picks, so the players never act in that phase.
+        The reward and undo record of the move include the discards.
 
-            card = self.cur_player_hand().pop_card_in_hand(move.info())
-            color_list = [False for _ in range(self._game.num_colors())]
-            color = card.color()
-            color_list[color] = True
-            value = card.value()
-            self.apply_to_enemy(color_list, value)
-            self._discard_desk.placecard(card)
-        elif move.type() == RegicideMoveType.DISCARD:
+        Args:
+            resolver: None to let the players discard one card per move, a
+              name of regicide_discard.DISCARD_RESOLVERS, or a function of
+              (cards in hand, damage) returning the cards to discard.
+        """
+        self._discard_resolver = None if resolver is None else get_discard_resolver(resolver)
+
+    def _resolve_discard(self):
+        """Discards the resolver's cards while the state is in the DISCARD phase."""
+        if self._discard_resolver is None:
+            return
+        reward = self._reward
+        while self._cur_state == RegicideStateType.DISCARD:
+            hand = self.cur_player_hand()
+            cards = self._discard_resolver([self._game.card(card_id) for card_id in hand.card_set()], self._demage)
+            if not cards:
+                raise ValueError("The discard resolver chose no card to discard.")
+            for card in cards:
+                if self._cur_state != RegicideStateType.DISCARD:
+                    break
+                if not hand.card_in_hand(card.info()):
+                    raise ValueError("The discard resolver chose %s, which is not in hand." % card)
+                # Discard moves follow the play moves, in card key order.
+                self._apply_move(self._moves[self._game.num_cards() + card.key()])
+                reward += self._reward
+        self._reward = reward
+
+    def apply_chance(self, outcome=None, undo=False):
+        """Resolves the pending chance node and finishes the move that opened it.
+
+        The reward of the whole move is available once the chance node has
+        been resolved.
+
+        Args:
+            outcome: one of chance_node().outcomes(), or None to draw it with
+              the state's random Generator.
+            undo: bool, whether to record the changes made.
+
+        Returns:
+            a RegicideUndoRecord to pass to undo_move() if undo is True,
+            None otherwise.
+
+        Raises:
+            ValueError: if there is no pending chance node or the outcome is
+              not possible.
+        """
+        chance = self._chance
+        if chance is None:
+            raise ValueError("The state is not at a chance node.")
+        record = None
+        if undo:
+            record = RegicideUndoRecord(self._demage, self._cur_state, self._reward, chance,
+                                        self._desk.known())
+        if outcome is None:
+            if record is not None:
+                record._rng_state = self._rng.bit_generator.state
+            outcome = chance.sample(self._rng)
+        indices = chance.indices(outcome)
+        self._undo_record = record
+        try:
+            self._version += 1
+            self._chance = None
+            card_ids = self._discard_desk.take_sample(indices)
+            self._desk.place_ids(card_ids)
+            self._log(RegicideUndoOp.DISCARD_TO_DRAW, indices, card_ids)
+            card_list, color_list, value = chance._continuation
+            self.apply_to_enemy(color_list, value, first_color=1)
+            self._end_play(card_list)
+            self._resolve_discard()
+        finally:
+            self._undo_record = None
+        return record
+
+    def undo_move(self, record):
+        """Reverts the move that produced record, restoring the prior state.
+
+        Records must be undone in the reverse order of the moves.
+        """
+        for op, a, b in reversed(record.ops()):
+            if op == RegicideUndoOp.HAND_POP:
+                self._hands[a].addcard(b)
+            elif op == RegicideUndoOp.HAND_DRAW:
+                self._hands[a].removefromhand(b)
+                self._desk.insertcard(b)
+            elif op == RegicideUndoOp.DISCARD_PLACE:
+                self._discard_desk.removecard(-1)
+            elif op == RegicideUndoOp.DISCARD_TO_DRAW:
+                self._desk.pop_ids(len(b))
+                self._discard_desk.restore_sample(a, b)
+            elif op == RegicideUndoOp.DRAW_INSERT:
+                self._desk.removecard(0)
+            elif op == RegicideUndoOp.ENEMY_DEAL:
+                self._enemy_desk.insert_id(a)
+            elif op == RegicideUndoOp.ENEMY_HEALTH:
+                self._enemy_desk.set_health(a, b)
+            elif op == RegicideUndoOp.ENEMY_ATTACK:
+                self._enemy_desk.set_attack(a, b)
+            elif op == RegicideUndoOp.ENEMY_ENCODING:
+                self._enemy_encoding[a] = b
+            else:
+                raise RuntimeError
+        if record._rng_state is not None:
+            self._rng.bit_generator.state = record._rng_state
+        self._demage = record._demage
+        self._cur_state = record._cur_state
+        self._reward = record._reward
+        self._chance = record._chance
+        self._desk.set_known(*record._draw_known)
+        self._version += 1
+
+    def _apply_move(self, move, stop_at_chance=False):
+        self._version += 1
+        self._reward = 0
+        if move.type() == RegicideMoveType.DISCARD:
             
-            card = self.cur_player_hand().pop_card_in_hand(move.info())
+            card = self._pop_hand_card(move.info())
             value = card.value()
             self._demage -= value
-            self._discard_desk.placecard(card)
+            self._place_discard(card)
             if self._demage <= 0:
                 self._demage = 0
                 self._cur_state = RegicideStateType.PLAY
-        elif move.type() == RegicideMoveType.ACE:
-            combo_list = []
-            card_list = []
-            color_list = [False for _ in range(self._game.num_colors())]
-            value = 0
-            
-            card = self.cur_player_hand().pop_card_in_hand(move.ace_info())
-            card_list.append(card)
+            self._end_play([])
+            return
 
-            card = self.cur_player_hand().pop_card_in_hand(move.info())
-            card_list.append(card)
-            for card in card_list:
-                value += card.value()
-                color_list[card.color()] = True
-            self.apply_to_enemy(color_list, value)
-            for card in card_list:
-                self._discard_desk.placecard(card)
+        if move.type() == RegicideMoveType.PLAY:
+            card_infos = [move.info()]
+        elif move.type() == RegicideMoveType.ACE:
+            card_infos = [move.ace_info(), move.info()]
         elif move.type() == RegicideMoveType.COMBO:
-            combo_list = move.combo_list()
-            card_list = []
-            value = 0
-            color_list = [False for _ in range(self._game.num_colors())]
-            for v, c in combo_list:
-                card = self.cur_player_hand().pop_card_in_hand((v, c))
-                card_list.append(card)
-                value += card.value()
-                color_list[card.color()] = True
-            self.apply_to_enemy(color_list, value)
-            for card in card_list:
-                self._discard_desk.placecard(card)
-            
+            card_infos = move.combo_list()
+        else:
+            raise RuntimeError
+        card_list = []
+        value = 0
+        color_list = [False for _ in range(self._game.num_colors())]
+        for card_info in card_infos:
+            card = self._pop_hand_card(card_info)
+            card_list.append(card)
+            value += card.value()
+            color_list[card.color()] = True
+        if not self.apply_to_enemy(color_list, value, stop_at_chance=stop_at_chance):
+            count = min(value, len(self._discard_desk))
+            self._chance = RegicideChanceNode(RegicideChanceType.HEART, count, self._discard_desk.ids().tolist(),
+                                              (card_list, color_list, value))
+            return
+        self._end_play(card_list)
+
+    def _end_play(self, card_list):
+        """Discards the cards played and checks whether the current player lost.
+
+        The game is also lost as soon as the damage to discard is at least the
+        value of the whole hand: discarding every card would leave the hand
+        empty. The reward is the one of discarding down to the empty hand.
+        """
+        for card in card_list:
+            self._place_discard(card)
         self.cur_player_hand().sort()
         if self.cur_player_hand_size() == 0 and not self._enemy_desk.empty():
             self._cur_state = RegicideStateType.LOSS
             self._reward -= self.score()
+        elif (self._cur_state == RegicideStateType.DISCARD and
+              self.cur_player_hand().total_value() <= self._demage):
+            self._cur_state = RegicideStateType.LOSS
+            self._reward -= self.score()
 
-    def apply_to_enemy(self, color_list, value):
-        enemy = self.current_enemy()
+    def apply_to_enemy(self, color_list, value, first_color=0, stop_at_chance=False):
+        """Applies the effects of the colors played and attacks the current enemy.
+
+        Returns:
+            False if stop_at_chance is set and the heart effect needs random
+            cards, before any later effect was applied; True otherwise.
+        """
+        enemy_color = self._enemy_desk.current_enemy_color()
         attack = value
-        for i in range(self._game.num_colors()):
-            if color_list[i] and i != enemy.color():
+        for i in range(first_color, self._game.num_colors()):
+            if color_list[i] and i != enemy_color:
                 if i == 0:
                     # Heart
-                    self.apply_heart_effect(value)
+                    if not self.apply_heart_effect(value, stop_at_chance):
+                        return False
                 elif i == 1:
                     # diamonds 
                     self.apply_diamonds_effect(value)
@@ -233,23 +881,38 @@ class RegicideState(object):
                     attack = self.apply_clubs_effect(value)
                 else:
                     raise RuntimeError
-            if color_list[i] and i == enemy.color():
+            if color_list[i] and i == enemy_color:
                 self._reward -= value / 20
         self.apply_attack_enemy(attack)
+        return True
 
-    def apply_heart_effect(self, value):
-        count = 0
-        for _ in range(value):
-            if self._discard_desk.empty():
-                self._reward += count / 20
-                return
-            else:
-                count += 1
-                card = self._discard_desk.random_pop()
-                self._desk.placecard(card)
+    def apply_heart_effect(self, value, stop_at_chance=False):
+        """Moves up to value random discarded cards to the bottom of the draw pile.
+
+        The reward for the cards moved is only given when the discard pile
+        runs out before value cards have been moved.
+
+        Returns:
+            False if stop_at_chance is set and cards have to be picked, in
+            which case nothing is moved; True otherwise.
+        """
+        count = len(self._discard_desk)
+        if count < value:
+            self._reward += count / 20
+        count = min(count, value)
+        if count == 0:
+            return True
+        if stop_at_chance:
+            return False
+        if self._undo_record is not None and self._undo_record._rng_state is None:
+            self._undo_record._rng_state = self._rng.bit_generator.state
+        indices, card_ids = self._discard_desk.random_sample(count)
+        self._desk.place_ids(card_ids)
+        self._log(RegicideUndoOp.DISCARD_TO_DRAW, indices, card_ids)
+        return True
 
     def apply_diamonds_effect(self, value):
-        draw_player = self.cur_player()
+        draw_player = self._cur_player
         count = 0
         for _ in range(value):
             if self.player_hands_full():
@@ -259,64 +922,110 @@ class RegicideState(object):
                 count += 1
                 while(self._hands[draw_player].full()):
                     draw_player = (draw_player + 1) % self.num_players()
-                self._hands[draw_player].drawcard()
+                card = self._hands[draw_player].drawcard()
+                if card is not None:
+                    self._log(RegicideUndoOp.HAND_DRAW, draw_player, card)
                 draw_player = (draw_player + 1) % self.num_players()
 
     def apply_spades_effect(self, value):
-        enemy = self.current_enemy()
-        self._reward += min(enemy.attack(), value) / 20
-        enemy.reduce_attack(value)
+        enemy_desk = self._enemy_desk
+        enemy_id = enemy_desk.current_enemy_key()
+        attack = enemy_desk.attack(enemy_id)
+        self._reward += min(attack, value) / 20
+        self._log(RegicideUndoOp.ENEMY_ATTACK, enemy_id, attack)
+        enemy_desk.set_attack(enemy_id, max(0, attack - value))
 
     def apply_clubs_effect(self, value):
-        self._reward += min(self.current_enemy().health() - value, value) / 20
+        self._reward += min(self._enemy_desk.current_enemy_health() - value, value) / 20
         return value * 2
 
     def apply_attack_enemy(self, attach):
-        enemy = self.current_enemy()
-        enemy.reduce_health(attach)
-        if enemy.health() <= 0:
-            self._enemy_desk.dealCard()
-            if enemy.health() == 0:
-                self._desk.insertcard(enemy)
+        enemy_desk = self._enemy_desk
+        enemy_id = enemy_desk.current_enemy_key()
+        health = enemy_desk.health(enemy_id)
+        self._log(RegicideUndoOp.ENEMY_HEALTH, enemy_id, health)
+        health -= attach
+        enemy_desk.set_health(enemy_id, health)
+        if health <= 0:
+            enemy = self._game.card(enemy_id)
+            enemy_desk.deal_id()
+            self._log(RegicideUndoOp.ENEMY_DEAL, enemy_id)
+            self._log(RegicideUndoOp.ENEMY_ENCODING, enemy.enemy_encoding(),
+                      self._enemy_encoding[enemy.enemy_encoding()])
+            if health == 0:
+                self._desk.insert_id(enemy_id)
+                self._log(RegicideUndoOp.DRAW_INSERT)
                 self._enemy_encoding[enemy.enemy_encoding()] = 0
                 # print(self._reward)
                 self._reward += 1 
-                self._reward += enemy._value / 100
+                self._reward += enemy.value() / 100
             else:
-                self._discard_desk.placecard(enemy)
+                self._place_discard(enemy)
                 self._enemy_encoding[enemy.enemy_encoding()] = 0
                 self._reward += 1 
-            if self._enemy_desk.empty():
+            if enemy_desk.empty():
                 self._cur_state = RegicideStateType.WIN
                 self._reward = 12
-        elif enemy.attack() != 0:
+        elif enemy_desk.attack(enemy_id) != 0:
             self._cur_state = RegicideStateType.DISCARD
-            self._demage = enemy.attack()
+            self._demage = enemy_desk.attack(enemy_id)
 
     def all_moves(self):
-        moves = []
-        max_moves = self._game.max_moves()
-        for move_id in range(max_moves):
-            move = self._RegicideMoveGenerator.generate(move_id)
-            moves.append(move)
-        return moves
+        """Returns a list of all moves of the game, indexed by move id."""
+        return list(self._moves)
+
+    def _legal_moves_cache(self):
+        """Returns the legal move views for the current state version.
+
+        The mask is computed at most once per version; the int, move and dict
+        views are derived from it lazily and cached alongside it.
+        """
+        if self._legal_version != self._version:
+            move_cards, move_phases = self._game.legal_move_table()
+            hand = self.cur_player_hand().bits() | (1 << self._game.num_cards())
+            hand = np.unpackbits(np.frombuffer(hand.to_bytes(8, 'little'), dtype=np.uint8),
+                                 bitorder='little').view(bool)
+            mask = hand[move_cards].all(axis=1) & move_phases[self._cur_state]
+            if self._chance is not None:
+                mask[:] = False
+            mask.flags.writeable = False
+            self._legal_cache = {"mask": mask}
+            self._legal_version = self._version
+        return self._legal_cache
+
+    def legal_action_mask(self):
+        """Returns a bool array of length max_moves(), True for legal moves.
+
+        The mask is computed in one pass from the game's move -> required cards
+        table: a move is legal when every card it needs is in the current
+        player's hand and its phase matches the current RegicideStateType.
+        The returned array is shared by all callers and is read-only.
+        """
+        return self._legal_moves_cache()["mask"]
 
     def legal_moves(self):
         """Returns list of legal moves for currently acting player."""
-        legal_moves = []
-        for move in self._moves:
-            if self.move_is_legal(move):
-                legal_moves.append(move)
-        return legal_moves
+        cache = self._legal_moves_cache()
+        if "moves" not in cache:
+            cache["moves"] = [self._moves[i] for i in self.legal_moves_as_int()]
+        return list(cache["moves"])
     
     def legal_moves_as_dict(self):
-        return list(map(lambda x: x.to_dict(), self.legal_moves()))
+        cache = self._legal_moves_cache()
+        if "dicts" not in cache:
+            cache["dicts"] = list(map(lambda x: x.to_dict(), self.legal_moves()))
+        return list(cache["dicts"])
 
     def legal_moves_as_int(self):
-        return list(map(lambda x: x.move(), self.legal_moves()))
+        cache = self._legal_moves_cache()
+        if "ints" not in cache:
+            cache["ints"] = np.flatnonzero(cache["mask"]).tolist()
+        return list(cache["ints"])
 
     def move_is_legal(self, move):
         """Returns true if and only if move is legal for active agent."""
+        if self._chance is not None:
+            return False
         if move.type() == RegicideMoveType.PLAY:
             card_info = move.info()#(move.rank(), move.color())
             if not self.cur_player_hand().card_in_hand(card_info):
@@ -419,7 +1128,19 @@ class RegicideGame(object):
         """Creates a RegicideGame object.
 
         Args:
-            params: is a dictionary of parameters and their values.
+            params: is a dictionary of parameters and their values. Besides
+              players, hand_size, enemy_health, enemy_attack, yield_enable,
+              maximum_combo and seed, optional parameters shrink the game
+              without changing the observation and action layouts:
+                - colors: the suits in play, default (0, 1, 2, 3).
+                - num_start_ranks: the number cards 1..n in play, default 10.
+                - enemy_levels: the enemy ranks in play from the jacks up,
+                  1 to 3, default 3.
+                - max_enemy_health, max_enemy_attack: the sizes of the
+                  health, attack and damage encodings, default the largest
+                  enemy_health and enemy_attack. Set them to the values of
+                  the full game so weights transfer between variants.
+              See regicide_variants for named configurations.
         """
 
         self._params = params
@@ -430,15 +1151,134 @@ class RegicideGame(object):
         self._yield_enable = params['yield_enable']
         self._maximum_combo = params['maximum_combo']
         self._seed = params['seed']
+        self._colors = tuple(params.get('colors', range(self.num_colors())))
+        self._num_start_ranks = params.get('num_start_ranks', 10)
+        self._enemy_levels = params.get('enemy_levels', self.enemy_ranks())
+        self._max_enemy_health = params.get('max_enemy_health', max(self._enemy_health))
+        self._max_enemy_attack = params.get('max_enemy_attack', max(self._enemy_attack))
+        if not set(self._colors) <= set(range(self.num_colors())) or not self._colors:
+            raise ValueError("colors must be a non-empty subset of %s." % list(range(self.num_colors())))
+        if not 1 <= self._num_start_ranks <= 10:
+            raise ValueError("num_start_ranks must be in [1, 10].")
+        if not 1 <= self._enemy_levels <= self.enemy_ranks():
+            raise ValueError("enemy_levels must be in [1, %d]." % self.enemy_ranks())
+        if (self._max_enemy_health < max(self._enemy_health[:self._enemy_levels]) or
+                self._max_enemy_attack < max(self._enemy_attack[:self._enemy_levels])):
+            raise ValueError("max_enemy_health and max_enemy_attack must cover the enemies in play.")
+        self._episode = 0
+        self._cards = card_table(self._enemy_attack, self.num_colors(), self.num_ranks())
+        self._zobrist = RegicideZobrist(self._num_players, self.num_cards(), self.num_cards())
 
         self._max_move = self.max_discard_moves() + self.max_play_moves() + \
                          self.max_combo_moves() + self.max_ace_moves()
+        self._move_table = move_table(self.num_colors(), self.num_ranks(), self._max_move)
+        self._legal_move_table = None
+        self._move_values = None
+        self._state_dtype = None
+        self._aggregate_dtype = None
+        self._template = None
 
     def setup(self):
         return
 
     def new_initial_state(self):
         return RegicideState(self)
+
+    def card(self, card_id):
+        """Returns the shared card flyweight for a card key.
+
+        Keys of enemy ranks map to a defeated enemy, whose value is its attack.
+        """
+        return self._cards[card_id]
+
+    def state_dtype(self):
+        """Returns the numpy structured dtype of a serialized RegicideState.
+
+        The layout is fixed for a game configuration: piles are card-key
+        arrays with a length, padded to num_cards(); hands are card bitmasks,
+        one uint64 per player; the random Generator is a PCG64 state.
+        """
+        if self._state_dtype is None:
+            num_cards = self.num_cards()
+            num_enemies = self.enemy_size()
+            self._state_dtype = np.dtype([
+                ('format', np.uint16),
+                ('hands', np.uint64, (self._num_players,)),
+                ('draw_len', np.uint8),
+                ('draw', np.int8, (num_cards,)),
+                ('draw_known', np.uint8, (2,)),
+                ('discard_len', np.uint8),
+                ('discard', np.int8, (num_cards,)),
+                ('enemy_len', np.uint8),
+                ('enemy', np.int8, (num_enemies,)),
+                ('enemy_health', np.int16, (num_enemies,)),
+                ('enemy_attack', np.int16, (num_enemies,)),
+                ('enemy_encoding', np.int8, (self.enemy_size(),)),
+                ('demage', np.int16),
+                ('cur_state', np.int8),
+                ('cur_player', np.int8),
+                ('reward', np.float64),
+                ('rng_state', np.uint64, (2,)),
+                ('rng_inc', np.uint64, (2,)),
+                ('rng_has_uint32', np.uint8),
+                ('rng_uinteger', np.uint32),
+            ])
+        return self._state_dtype
+
+    def aggregate_dtype(self):
+        """Returns the numpy structured dtype of the derived fields of a RegicideState.
+
+        These are the pile and hand hashes and the hands' running totals,
+        which unpacking a state_dtype() record otherwise recomputes. See
+        pack_aggregates() and unpack_states().
+        """
+        if self._aggregate_dtype is None:
+            num_players = self._num_players
+            self._aggregate_dtype = np.dtype([
+                ('draw_hash', np.uint64),
+                ('discard_hash', np.uint64),
+                ('enemy_hash', np.uint64),
+                ('enemy_stats_hash', np.uint64),
+                ('hand_size', np.uint8, (num_players,)),
+                ('hand_hash', np.uint64, (num_players,)),
+                ('hand_value', np.int16, (num_players,)),
+                ('rank_counts', np.uint8, (num_players, self.num_ranks())),
+                ('color_counts', np.uint8, (num_players, self.num_colors())),
+            ])
+        return self._aggregate_dtype
+
+    def _template_state(self):
+        """Returns a dealt state that deserialized states are cloned from."""
+        if self._template is None:
+            self._template = RegicideState(self, np.random.Generator(np.random.PCG64(0)))
+        return self._template
+
+    def move_table(self):
+        """Returns the RegicideMoveTable shared by the states of the game."""
+        return self._move_table
+
+    def zobrist(self):
+        """Returns the RegicideZobrist keys shared by the states of the game."""
+        return self._zobrist
+
+    def seed(self, seed):
+        """Reseeds the game and restarts its episode counter."""
+        self._seed = seed
+        self._episode = 0
+
+    def episode(self):
+        """Returns the number of states dealt since the game was (re)seeded."""
+        return self._episode
+
+    def new_rng(self):
+        """Returns the random Generator for the next episode.
+
+        The Generator is derived from the "seed" parameter and the episode
+        counter, so the sequence of deals is reproducible from the seed.
+        """
+        seed_sequence = np.random.SeedSequence(self._seed, spawn_key=(self._episode,))
+        self._episode += 1
+        return np.random.default_rng(seed_sequence)
         
     def __del__(self):
         del self
@@ -462,20 +1302,22 @@ class RegicideGame(object):
         return self._enemy_health
 
     def max_enemy_health(self):
-        return max(self._enemy_health)
+        """Returns the largest encodable enemy health, see the max_enemy_health parameter."""
+        return self._max_enemy_health
 
     def enemy_attack(self):
         """Returns the enemy attack modifier in the game."""
         return self._enemy_attack
 
     def max_enemy_attack(self):
-        return max(self._enemy_attack)
+        """Returns the largest encodable enemy attack, see the max_enemy_attack parameter."""
+        return self._max_enemy_attack
 
     def yield_enable(self):
         """Returns whether the yield option is enable in the game."""
         return self._yield_enable
 
-    def yield_enable(self):
+    def maximum_combo(self):
         """Returns the Maximum combo limit in the game."""
         return self._maximum_combo
 
@@ -489,14 +1331,34 @@ class RegicideGame(object):
 
     def num_start_ranks(self):
         """Returns number of instances of Card(color, rank) in the initial deck."""
-        return 10
+        return self._num_start_ranks
+
+    def colors(self):
+        """Returns the suits in play, a subset of range(num_colors())."""
+        return self._colors
+
+    def enemy_levels(self):
+        """Returns the number of enemy ranks in play, from the jacks up."""
+        return self._enemy_levels
+
+    def num_enemies(self):
+        """Returns the number of enemies in the enemy desk at the start."""
+        return len(self._colors) * self._enemy_levels
+
+    def initial_enemy_encoding(self):
+        """Returns the enemy encoding at the start: 1 for every enemy in play."""
+        encoding = [0 for _ in range(self.enemy_size())]
+        for level in range(self._enemy_levels):
+            for color in self._colors:
+                encoding[level * self.num_colors() + color] = 1
+        return encoding
 
     def num_ranks(self):
         """Returns number of instances of Card(color, rank) in the initial deck."""
         return 13
 
     def enemy_ranks(self):
-        """Returns number of instances of Card(color, rank) in the initial deck."""
+        """Returns the number of enemy ranks of the encodings, whatever enemy_levels() is."""
         return 3
 
     # TODO
@@ -504,6 +1366,34 @@ class RegicideGame(object):
         """Returns the number of possible legal moves in the game."""
         return self._max_move
 
+    def legal_move_table(self):
+        """Returns the move -> required cards incidence table.
+
+        Returns:
+            move_cards: int array of shape (max_moves, 4), the card keys each
+              move needs in hand, padded with num_cards().
+            move_phases: bool array of shape (len(RegicideStateType), max_moves),
+              True where the move can be played in that state type.
+        """
+        if self._legal_move_table is None:
+            table = self._move_table
+            move_phases = np.zeros((len(RegicideStateType), self._max_move), dtype=bool)
+            discard = table.types == RegicideMoveType.DISCARD
+            move_phases[RegicideStateType.DISCARD] = discard
+            move_phases[RegicideStateType.PLAY] = ~discard & ~table.self_aces
+            self._legal_move_table = (table.required_ids, move_phases)
+        return self._legal_move_table
+
+    def move_values(self):
+        """Returns the total card value of each move and whether it holds a club.
+
+        See RegicideMoveTable.move_values() and regicide_move.greedy_scores().
+        """
+        if self._move_values is None:
+            card_values = [self.card(card_id).value() for card_id in range(self.num_cards())]
+            self._move_values = self._move_table.move_values(card_values)
+        return self._move_values
+
     def max_discard_moves(self):
         return self.num_cards()
 
@@ -527,10 +1417,13 @@ class RegicideGame(object):
 
     def get_move_uid(self, move):
         """Returns a unique ID describing a legal move, or -1 for invalid move."""
-        return None
+        if move is None:
+            return -1
+        return move.move()
 
     def get_move(self, move_uid):
-        return None
+        """Returns the shared move object of a move id."""
+        return self._move_table.move(move_uid)
 
 class RegicideObservation(object):
     """Player's observed view of an environment RegicideState.
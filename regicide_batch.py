@@ -0,0 +1,476 @@
+"""Structure-of-arrays engine stepping many Regicide games at once."""
+import numpy as np
+
+from regicide import RegicideStateType
+from regicide_move import RegicideMoveType
+
+# Number of set bits for every byte value, used to count cards in hand bitsets.
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+# Capacity of the per-game pile arrays; every card of the game fits in a pile.
+PILE_CAPACITY = 64
+
+# Per-game arrays of a RegicideBatchState, indexed by game on the first axis.
+ROW_FIELDS = ("_hands", "_draw", "_draw_head", "_draw_len", "_discard", "_discard_len",
+              "_enemy_ids", "_enemy_health", "_enemy_attack", "_enemy_head", "_enemy_encoding",
+              "_demage", "_cur_state", "_cur_player", "_reward")
+
+
+def popcount64(bits):
+    """Returns the number of set bits of each element of a uint64 array."""
+    bits = np.ascontiguousarray(bits, dtype=np.uint64)
+    return _POPCOUNT8[bits.view(np.uint8)].reshape(bits.shape + (8,)).sum(axis=-1)
+
+
+def unpack_hands(bits, num_cards):
+    """Returns a bool array of shape bits.shape + (num_cards + 1,).
+
+    The extra last column is always True so that padded entries of the move
+    incidence table (which point at num_cards) never make a move illegal.
+    """
+    bits = np.ascontiguousarray(bits, dtype=np.uint64) | (np.uint64(1) << np.uint64(num_cards))
+    unpacked = np.unpackbits(bits.view(np.uint8).reshape(bits.shape + (8,)), axis=-1, bitorder='little')
+    return unpacked[..., :num_cards + 1].view(bool)
+
+
+class RegicideBatchState(object):
+    """A batch of independent Regicide games stored as NumPy arrays.
+
+    Each game is a row: hands are uint64 card bitsets, the draw pile is a ring
+    buffer of card keys with a head index and a length, the discard pile is an
+    unordered array of card keys with a length, and the enemy desk is a fixed
+    order of enemy keys with per-enemy health and attack and a head index.
+    apply_moves(), legal_masks() and encode() process the whole batch with
+    vectorized operations and follow the rules of RegicideState.apply_move.
+    """
+
+    def __init__(self, game, batch_size, seed=None):
+        """Deals batch_size new games.
+
+        Args:
+            game: A RegicideGame instance, containing the game configuration.
+            batch_size: an integer, the number of games in the batch.
+            seed: an optional seed for the batch's numpy random Generator.
+        """
+        self._setup(game, batch_size, np.random.default_rng(seed))
+        rows = np.arange(batch_size)
+
+        num_ranks = game.num_ranks()
+        draw = np.array([color * num_ranks + rank
+                         for color in game.colors()
+                         for rank in range(game.num_start_ranks())], dtype=np.int8)
+        order = self._rng.random((batch_size, len(draw))).argsort(axis=1)
+        self._draw[:, :len(draw)] = draw[order]
+        self._draw_len[:] = len(draw)
+
+        enemy_ids = []
+        for rank in range(10, 10 + game.enemy_levels()):
+            group = np.array([color * num_ranks + rank for color in game.colors()], dtype=np.int8)
+            order = self._rng.random((batch_size, len(group))).argsort(axis=1)
+            enemy_ids.append(group[order])
+        self._enemy_ids[:] = np.concatenate(enemy_ids, axis=1)
+        self._reset_enemy_stats()
+
+        for player in range(self._num_players):
+            for _ in range(game.hand_size()):
+                card = self._draw[rows, self._draw_head]
+                self._hands[:, player] |= np.uint64(1) << card.astype(np.uint64)
+                self._draw_head = (self._draw_head + 1) % PILE_CAPACITY
+                self._draw_len -= 1
+
+    @classmethod
+    def from_states(cls, game, states, seed=None):
+        """Creates a batch holding a copy of each given RegicideState.
+
+        Args:
+            game: the RegicideGame the states belong to.
+            states: a list of RegicideState objects.
+            seed: an optional seed for the batch's numpy random Generator.
+        """
+        batch = cls.__new__(cls)
+        batch._setup(game, len(states), np.random.default_rng(seed))
+        for row, state in enumerate(states):
+            for player in range(batch._num_players):
+                batch._hands[row, player] = np.uint64(state._hands[player].bits())
+            draw = state._desk.ids()
+            batch._draw[row, :len(draw)] = draw
+            batch._draw_len[row] = len(draw)
+            discard = state._discard_desk.ids()
+            batch._discard[row, :len(discard)] = discard
+            batch._discard_len[row] = len(discard)
+            enemy_desk = state._enemy_desk
+            offset = batch._num_enemies - len(enemy_desk)
+            batch._enemy_head[row] = offset
+            for i, enemy_id in enumerate(enemy_desk.ids()):
+                batch._enemy_ids[row, offset + i] = enemy_id
+                batch._enemy_health[row, offset + i] = enemy_desk.health(enemy_id)
+                batch._enemy_attack[row, offset + i] = enemy_desk.attack(enemy_id)
+            batch._enemy_encoding[row] = state.enemy_encoding()
+            batch._demage[row] = state._demage
+            batch._cur_state[row] = state.cur_state()
+            batch._cur_player[row] = state.cur_player()
+            batch._reward[row] = state._reward
+        return batch
+
+    @classmethod
+    def from_records(cls, game, records, seed=None):
+        """Creates a batch from an array of game.state_dtype() records.
+
+        See RegicideState.to_bytes() and sample_determinizations(). The
+        records' random Generator states are not used, the batch draws from
+        its own Generator.
+        """
+        batch = cls.__new__(cls)
+        batch._setup(game, len(records), np.random.default_rng(seed))
+        num_cards = game.num_cards()
+        batch._hands[:] = records['hands']
+        batch._draw[:, :num_cards] = records['draw']
+        batch._draw_len[:] = records['draw_len']
+        batch._discard[:, :num_cards] = records['discard']
+        batch._discard_len[:] = records['discard_len']
+        # The batch keeps the enemies right aligned, the head at the first one left.
+        head = batch._num_enemies - records['enemy_len'].astype(np.int64)
+        source = np.arange(batch._num_enemies)[None, :] - head[:, None]
+        valid = source >= 0
+        source = np.maximum(source, 0)
+        rows = np.arange(len(records))[:, None]
+        batch._enemy_head[:] = head
+        batch._enemy_ids[:] = np.where(valid, records['enemy'][rows, source], 0)
+        batch._enemy_health[:] = np.where(valid, records['enemy_health'][rows, source], 0)
+        batch._enemy_attack[:] = np.where(valid, records['enemy_attack'][rows, source], 0)
+        batch._enemy_encoding[:] = records['enemy_encoding']
+        batch._demage[:] = records['demage']
+        batch._cur_state[:] = records['cur_state']
+        batch._cur_player[:] = records['cur_player']
+        batch._reward[:] = records['reward']
+        return batch
+
+    @classmethod
+    def from_state(cls, game, state, batch_size, seed=None):
+        """Creates a batch of batch_size copies of one RegicideState.
+
+        The copies share the state's deal but draw their own random numbers,
+        so they diverge at the first heart effect.
+        """
+        single = cls.from_states(game, [state], seed)
+        batch = cls.__new__(cls)
+        batch._setup(game, 0, single._rng)
+        batch._batch_size = batch_size
+        for field in ROW_FIELDS:
+            setattr(batch, field, np.repeat(getattr(single, field), batch_size, axis=0))
+        return batch
+
+    def _setup(self, game, batch_size, rng):
+        """Allocates the arrays for batch_size empty games."""
+        self._game = game
+        self._rng = rng
+        self._batch_size = batch_size
+        self._num_players = game.num_players()
+        self._num_cards = game.num_cards()
+        self._num_ranks = game.num_ranks()
+        self._num_enemies = game.num_enemies()
+
+        ranks = np.arange(self._num_cards) % self._num_ranks
+        self._card_colors = np.arange(self._num_cards) // self._num_ranks
+        self._card_values = np.where(
+            ranks < 10, ranks + 1,
+            np.asarray(game.enemy_attack())[np.clip(ranks - 10, 0, None)]).astype(np.int64)
+        # Padded entries of the move table point at num_cards and are worth nothing.
+        self._card_values = np.append(self._card_values, 0)
+
+        self._move_cards, self._move_phases = game.legal_move_table()
+        self._move_types = game.move_table().types
+
+        self._hands = np.zeros((batch_size, self._num_players), dtype=np.uint64)
+        self._draw = np.zeros((batch_size, PILE_CAPACITY), dtype=np.int8)
+        self._draw_head = np.zeros(batch_size, dtype=np.int64)
+        self._draw_len = np.zeros(batch_size, dtype=np.int64)
+        self._discard = np.zeros((batch_size, PILE_CAPACITY), dtype=np.int8)
+        self._discard_len = np.zeros(batch_size, dtype=np.int64)
+        self._enemy_ids = np.zeros((batch_size, self._num_enemies), dtype=np.int8)
+        self._enemy_health = np.zeros((batch_size, self._num_enemies), dtype=np.int64)
+        self._enemy_attack = np.zeros((batch_size, self._num_enemies), dtype=np.int64)
+        self._enemy_head = np.zeros(batch_size, dtype=np.int64)
+        self._enemy_encoding = np.tile(np.array(game.initial_enemy_encoding(), dtype=np.int64), (batch_size, 1))
+        self._demage = np.zeros(batch_size, dtype=np.int64)
+        self._cur_state = np.full(batch_size, RegicideStateType.PLAY, dtype=np.int64)
+        self._cur_player = np.zeros(batch_size, dtype=np.int64)
+        self._reward = np.zeros(batch_size, dtype=np.float64)
+
+    def _reset_enemy_stats(self):
+        """Sets every enemy's health and attack from the game configuration."""
+        level = self._enemy_ids % self._num_ranks - 10
+        self._enemy_health[:] = np.asarray(self._game.enemy_health())[level]
+        self._enemy_attack[:] = np.asarray(self._game.enemy_attack())[level]
+
+    def batch_size(self):
+        return self._batch_size
+
+    def num_players(self):
+        return self._num_players
+
+    def rewards(self):
+        """Returns the rewards of the last apply_moves() call."""
+        return self._reward
+
+    def cur_state(self):
+        return self._cur_state
+
+    def cur_player(self):
+        return self._cur_player
+
+    def is_terminal(self):
+        return (self._cur_state == RegicideStateType.WIN) | (self._cur_state == RegicideStateType.LOSS)
+
+    def is_win(self):
+        return self._cur_state == RegicideStateType.WIN
+
+    def deck_size(self):
+        return self._draw_len
+
+    def discard_desk_size(self):
+        return self._discard_len
+
+    def enemy_desk_size(self):
+        return self._num_enemies - self._enemy_head
+
+    def score(self):
+        return self.enemy_desk_size()
+
+    def enemies_defeated(self):
+        """Returns the number of enemies defeated in each game."""
+        return self._enemy_head.copy()
+
+    def hand_sizes(self):
+        """Returns the number of cards in each player's hand, shape (N, players)."""
+        return popcount64(self._hands)
+
+    def cur_player_hands(self):
+        """Returns the current player's hand bitset of each game."""
+        return self._hands[np.arange(self._batch_size), self._cur_player]
+
+    def _current_enemy(self, field):
+        """Returns field at the enemy head, or 0 for games without enemies left."""
+        index = np.minimum(self._enemy_head, self._num_enemies - 1)
+        value = field[np.arange(self._batch_size), index]
+        return np.where(self._enemy_head < self._num_enemies, value, 0)
+
+    def current_enemy_health(self):
+        return self._current_enemy(self._enemy_health)
+
+    def current_enemy_attack(self):
+        return self._current_enemy(self._enemy_attack)
+
+    def current_enemy_color(self):
+        return self._current_enemy(self._enemy_ids) // self._num_ranks
+
+    def current_enemy_rank(self):
+        # The end-of-game enemy is a rank 10 card, like regicide_desk.END_ENEMY.
+        ids = self._current_enemy(self._enemy_ids)
+        return np.where(self._enemy_head < self._num_enemies, ids % self._num_ranks - 10, 0)
+
+    def legal_masks(self):
+        """Returns the legal action masks, a bool array of shape (N, max_moves)."""
+        hands = unpack_hands(self.cur_player_hands(), self._num_cards)
+        masks = hands[:, self._move_cards].all(axis=-1)
+        return masks & self._move_phases[self._cur_state]
+
+    def _pile_append(self, pile, length, rows, cards):
+        pile[rows, length[rows]] = cards
+        length[rows] += 1
+
+    def _draw_append(self, rows, cards):
+        """Places cards at the bottom of the draw pile of the given rows."""
+        tail = (self._draw_head[rows] + self._draw_len[rows]) % PILE_CAPACITY
+        self._draw[rows, tail] = cards
+        self._draw_len[rows] += 1
+
+    def _draw_insert(self, rows, cards):
+        """Inserts cards at the top of the draw pile of the given rows."""
+        self._draw_head[rows] = (self._draw_head[rows] - 1) % PILE_CAPACITY
+        self._draw[rows, self._draw_head[rows]] = cards
+        self._draw_len[rows] += 1
+
+    def _draw_deal(self, rows):
+        """Deals the top card of the draw pile of the given rows."""
+        cards = self._draw[rows, self._draw_head[rows]]
+        self._draw_head[rows] = (self._draw_head[rows] + 1) % PILE_CAPACITY
+        self._draw_len[rows] -= 1
+        return cards
+
+    def apply_moves(self, actions):
+        """Applies one move to every game of the batch.
+
+        Args:
+            actions: an int array of shape (N,), the move id for each game.
+              Entries for games that are already terminal are ignored.
+
+        Returns:
+            the reward of each game for this step, as RegicideState._reward.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        active = ~self.is_terminal()
+        rows = np.flatnonzero(active)
+        actions = actions[rows]
+        assert self.legal_masks()[rows, actions].all()
+        self._reward[:] = 0
+
+        cards = self._move_cards[actions]
+        played = cards < self._num_cards
+        bits = np.where(played, np.uint64(1) << np.minimum(cards, 63).astype(np.uint64), np.uint64(0))
+        self._hands[rows, self._cur_player[rows]] &= ~np.bitwise_or.reduce(bits, axis=1)
+
+        discard = self._move_types[actions] == RegicideMoveType.DISCARD
+        self._apply_discards(rows[discard], cards[discard, 0])
+        self._apply_plays(rows[~discard], cards[~discard], played[~discard])
+
+        hand_sizes = popcount64(self.cur_player_hands()[rows])
+        loss = rows[(hand_sizes == 0) & (self._enemy_head[rows] < self._num_enemies)]
+        self._cur_state[loss] = RegicideStateType.LOSS
+        self._reward[loss] -= self.score()[loss]
+
+        # As RegicideState._end_play, a hand worth no more than the damage is lost.
+        discard_rows = rows[self._cur_state[rows] == RegicideStateType.DISCARD]
+        hands = unpack_hands(self.cur_player_hands()[discard_rows], self._num_cards)
+        hand_values = hands[:, :self._num_cards] @ self._card_values[:self._num_cards]
+        loss = discard_rows[hand_values <= self._demage[discard_rows]]
+        self._cur_state[loss] = RegicideStateType.LOSS
+        self._reward[loss] -= self.score()[loss]
+        return self._reward
+
+    def _apply_discards(self, rows, cards):
+        self._demage[rows] -= self._card_values[cards]
+        self._pile_append(self._discard, self._discard_len, rows, cards)
+        done = rows[self._demage[rows] <= 0]
+        self._demage[done] = 0
+        self._cur_state[done] = RegicideStateType.PLAY
+
+    def _apply_plays(self, rows, cards, played):
+        value = self._card_values[cards].sum(axis=1)
+        colors = self._colors_played(cards, played)
+        enemy = self._enemy_head[rows]
+        enemy_color = self._enemy_ids[rows, enemy] // self._num_ranks
+        attack = value.copy()
+
+        for color in range(self._game.num_colors()):
+            effect = colors[:, color] & (enemy_color != color)
+            immune = colors[:, color] & (enemy_color == color)
+            if color == 0:
+                self._apply_heart_effect(rows[effect], value[effect])
+            elif color == 1:
+                self._apply_diamonds_effect(rows[effect], value[effect])
+            elif color == 2:
+                effect_rows = rows[effect]
+                enemy_attack = self._enemy_attack[effect_rows, enemy[effect]]
+                self._reward[effect_rows] += np.minimum(enemy_attack, value[effect]) / 20
+                self._enemy_attack[effect_rows, enemy[effect]] = np.maximum(0, enemy_attack - value[effect])
+            elif color == 3:
+                effect_rows = rows[effect]
+                enemy_health = self._enemy_health[effect_rows, enemy[effect]]
+                self._reward[effect_rows] += np.minimum(enemy_health - value[effect], value[effect]) / 20
+                attack[effect] = value[effect] * 2
+            self._reward[rows[immune]] -= value[immune] / 20
+
+        self._apply_attack_enemy(rows, attack)
+        for i in range(cards.shape[1]):
+            column = played[:, i]
+            self._pile_append(self._discard, self._discard_len, rows[column], cards[column, i])
+
+    def _colors_played(self, cards, played):
+        """Returns a (rows, colors) bool array of the colors among the played cards."""
+        colors = np.zeros((len(cards), self._game.num_colors()), dtype=bool)
+        for i in range(cards.shape[1]):
+            column = played[:, i]
+            colors[np.flatnonzero(column), self._card_colors[cards[column, i]]] = True
+        return colors
+
+    def _apply_heart_effect(self, rows, value):
+        """Moves up to value random cards from the discard to the draw pile bottom."""
+        count = np.minimum(value, self._discard_len[rows])
+        short = self._discard_len[rows] < value
+        self._reward[rows[short]] += self._discard_len[rows[short]] / 20
+        for i in range(count.max(initial=0)):
+            pick_rows = rows[count > i]
+            index = (self._rng.random(len(pick_rows)) * self._discard_len[pick_rows]).astype(np.int64)
+            cards = self._discard[pick_rows, index]
+            last = self._discard_len[pick_rows] - 1
+            self._discard[pick_rows, index] = self._discard[pick_rows, last]
+            self._discard_len[pick_rows] = last
+            self._draw_append(pick_rows, cards)
+
+    def _apply_diamonds_effect(self, rows, value):
+        """Deals up to value cards round-robin into the hands that are not full."""
+        hand_size = self._game.hand_size()
+        free = (hand_size - popcount64(self._hands[rows])).sum(axis=1)
+        count = np.minimum(np.minimum(value, free), self._draw_len[rows])
+        fills = (free < value) & (self._draw_len[rows] >= free)
+        self._reward[rows[fills]] += free[fills] / 20
+        draw_player = self._cur_player[rows].copy()
+        for i in range(count.max(initial=0)):
+            draw = count > i
+            draw_rows = rows[draw]
+            player = draw_player[draw]
+            for _ in range(self._num_players):
+                full = popcount64(self._hands[draw_rows, player]) == hand_size
+                player = np.where(full, (player + 1) % self._num_players, player)
+            cards = self._draw_deal(draw_rows)
+            self._hands[draw_rows, player] |= np.uint64(1) << cards.astype(np.uint64)
+            draw_player[draw] = (player + 1) % self._num_players
+
+    def _apply_attack_enemy(self, rows, attack):
+        enemy = self._enemy_head[rows]
+        self._enemy_health[rows, enemy] -= attack
+        health = self._enemy_health[rows, enemy]
+        ids = self._enemy_ids[rows, enemy]
+
+        killed = health <= 0
+        self._enemy_head[rows[killed]] += 1
+        self._enemy_encoding[rows[killed], (ids[killed] % self._num_ranks - 10) * 4 +
+                             ids[killed] // self._num_ranks] = 0
+        exact = killed & (health == 0)
+        self._draw_insert(rows[exact], ids[exact])
+        self._reward[rows[exact]] += 1
+        self._reward[rows[exact]] += self._card_values[ids[exact]] / 100
+        overkill = killed & (health < 0)
+        self._pile_append(self._discard, self._discard_len, rows[overkill], ids[overkill])
+        self._reward[rows[overkill]] += 1
+
+        win = rows[killed][self._enemy_head[rows[killed]] == self._num_enemies]
+        self._cur_state[win] = RegicideStateType.WIN
+        self._reward[win] = 12
+        hit = ~killed & (self._enemy_attack[rows, enemy] != 0)
+        self._cur_state[rows[hit]] = RegicideStateType.DISCARD
+        self._demage[rows[hit]] = self._enemy_attack[rows[hit], enemy[hit]]
+
+    def encode(self):
+        """Returns the vectorized observation of every game.
+
+        The layout matches ObservationEncoder.encode for the current player.
+        """
+        game = self._game
+        n = self._batch_size
+        rows = np.arange(n)
+
+        def one_hot(size, index):
+            encoding = np.zeros((n, size), dtype=np.float32)
+            encoding[rows, index] = 1
+            return encoding
+
+        hand = unpack_hands(self.cur_player_hands(), self._num_cards)[:, :self._num_cards]
+        hand_size = np.zeros((n, game.num_players() * game.hand_size() + 1), dtype=np.float32)
+        sizes = self.hand_sizes()
+        for player in range(game.num_players()):
+            hand_size[rows, player * game.hand_size() + sizes[:, player]] = 1
+        return np.concatenate([
+            hand.astype(np.float32),
+            one_hot(game.num_cards(), self._draw_len),
+            one_hot(game.num_cards(), self._discard_len),
+            self._enemy_encoding.astype(np.float32),
+            one_hot(game.num_colors(), self.current_enemy_color()),
+            one_hot(game.enemy_ranks(), self.current_enemy_rank()),
+            one_hot(game.max_enemy_health() + 1, self.current_enemy_health()),
+            one_hot(game.max_enemy_attack() + 1, self.current_enemy_attack()),
+            hand_size,
+            one_hot(game.max_enemy_attack() + 1, self._demage),
+            one_hot(len(RegicideStateType), self._cur_state),
+        ], axis=1)
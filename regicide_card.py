@@ -22,9 +22,12 @@ def color_idx_to_char(color_idx):
 class RegicideCard(object):
     """Regicide card, with color and rank.
 
-    Python implementation of RegicideCard class.
+    Python implementation of RegicideCard class. Cards are immutable, the
+    shared instances are looked up by key with card_from_id().
     """
 
+    __slots__ = ("_color", "_rank", "_value")
+
     def __init__(self, color, rank):
         """A simple RegicideCard object.
 
@@ -81,9 +84,13 @@ class RegicideCard(object):
 class RegicideEnemy(RegicideCard):
     """Regicide card, with a color and a rank.
 
-    Python implementation of RegicideCard class.
+    Python implementation of RegicideCard class. An enemy object is an
+    immutable snapshot; the health and attack of the enemies in play are kept
+    in the arrays of RegicideEnemyDesk.
     """
 
+    __slots__ = ("_health", "_attack", "_level", "_enemy_encoding")
+
     def __init__(self, color, rank, health, attack):
         """A simple RegicideCard object.
 
@@ -115,14 +122,45 @@ class RegicideEnemy(RegicideCard):
     def enemy_encoding(self):
         return self._enemy_encoding
 
-    def reduce_attack(self, sheild):
-        self._attack = max(0, self._attack - sheild)
-
-    def reduce_health(self, attack):
-        self._health = self._health - attack
-
     def __str__(self):
         if self.valid():
             return "E" + str(self._rank + 1) + ' ' + COLOR_CHAR[self._color] + ' H' + str(self._health) + ' A' +str(self._attack)
         else:
-            return "XX"
\ No newline at end of file
+            return "XX"
+
+
+ROYAL_VALUES = (10, 15, 20)
+
+_CARD_TABLES = {}
+
+def card_table(royal_values=ROYAL_VALUES, num_colors=4, num_ranks=13):
+  """Returns the interned table of card flyweights, indexed by card key.
+
+  Cards of rank 10 and above are defeated enemies, worth royal_values[rank - 10]
+  when played. Tables are built once per set of values and then shared.
+
+  Args:
+    royal_values: the values of the Jack, Queen and King.
+    num_colors: int, number of colors.
+    num_ranks: int, number of ranks.
+
+  Returns:
+    cards: a tuple of num_colors * num_ranks RegicideCard objects.
+  """
+  key = (tuple(royal_values), num_colors, num_ranks)
+  if key not in _CARD_TABLES:
+    cards = []
+    for card_id in range(num_colors * num_ranks):
+      color, rank = divmod(card_id, num_ranks)
+      if rank < 10:
+        cards.append(RegicideCard(color, rank))
+      else:
+        cards.append(RegicideEnemy(color, rank, 0, royal_values[rank - 10]))
+    _CARD_TABLES[key] = tuple(cards)
+  return _CARD_TABLES[key]
+
+CARDS = card_table()
+
+def card_from_id(card_id):
+  """Returns the standard card flyweight for a card key."""
+  return CARDS[card_id]
@@ -1,24 +1,83 @@
-import random
 from abc import ABC
+
+import numpy as np
+
 from regicide_card import RegicideCard, RegicideEnemy
+from regicide_hash import MASK64
+
+# The enemy current_enemy() returns once every enemy is defeated.
+END_ENEMY = RegicideEnemy(0, 10, 0, 0)
 
 class RegicideDesk(ABC):
-    def __init__(self, game):
+    def __init__(self, game, rng=None):
         """Creates a RegicideDesk object.
 
+        The cards are stored by key in a fixed-capacity integer array used as
+        a ring buffer, so dealing from the top, placing at the bottom and
+        inserting at the top are all O(1).
+
         Args:
             game: A game instance, containing information about the game configuration.
+            rng: A numpy random Generator used to shuffle and sample the desk.
         """
         self._index = 0
         self._game = game
-        self._desk = [] # Initialize an empty desk
+        self._rng = rng if rng is not None else np.random.default_rng()
+        self._capacity = game.num_cards()
+        self._desk = np.zeros(self._capacity, dtype=np.int8) # Card keys, from self._head onwards
+        self._head = 0
+        self._size = 0
+        self._zobrist = game.zobrist()
+        self._keys = self._zobrist.draw
+        self._hash = 0
         self._num_ranks = game.num_start_ranks() # Get the number of ranks from the game instance
         self._num_colors = game.num_colors()  # Get the number of colors from the game instance
 
+    def _card(self, card_id):
+        """Returns the card object for a card key."""
+        return self._game.card(card_id)
+
+    def hash(self):
+        """Returns the 64-bit hash of the desk content, see RegicideZobrist."""
+        return self._hash
+
+    def _hash_deal(self, card_id):
+        self._hash = ((self._hash - self._keys[card_id]) * self._zobrist.inverse_base) & MASK64
+
+    def _hash_insert(self, card_id):
+        self._hash = (self._keys[card_id] + self._hash * self._zobrist.base) & MASK64
+
+    def _hash_place(self, card_id):
+        """Adds card_id as the card at position self._size."""
+        self._hash = (self._hash + self._keys[card_id] * self._zobrist.power[self._size]) & MASK64
+
+    def _hash_pop(self, card_id):
+        """Removes card_id as the card at position self._size."""
+        self._hash = (self._hash - self._keys[card_id] * self._zobrist.power[self._size]) & MASK64
+
+    def _rehash(self):
+        self._hash = self._zobrist.ordered(self._keys, self.ids().tolist())
+
     def card(self, index):
         """Returns the card at the given index in the desk.
         """
-        return self._desk[index]
+        if index < 0:
+            index += self._size
+        return self._card(int(self._desk[(self._head + index) % self._capacity]))
+
+    def ids(self):
+        """Returns the card keys in the desk, from the top, as a new array."""
+        end = self._head + self._size
+        if end <= self._capacity:
+            return self._desk[self._head:end].copy()
+        return np.concatenate((self._desk[self._head:], self._desk[:end - self._capacity]))
+
+    def bits(self):
+        """Returns the set of card keys in the desk as an integer bitmask."""
+        bits = 0
+        for card_id in self.ids().tolist():
+            bits |= 1 << card_id
+        return bits
 
     def setup(self):
         """Sets up the desk. This method should be implemented by subclasses."""
@@ -26,123 +85,432 @@ class RegicideDesk(ABC):
 
     def empty(self):
         """Checks if the desk is empty."""
-        return len(self._desk) == 0
+        return self._size == 0
+
+    def deal_id(self):
+        """Deals a card key from the top of desk."""
+        card_id = int(self._desk[self._head])
+        self._hash_deal(card_id)
+        self._head = (self._head + 1) % self._capacity
+        self._size -= 1
+        return card_id
+
+    def place_id(self, card_id):
+        """Places a card key at the end of the desk."""
+        self._hash_place(card_id)
+        self._desk[(self._head + self._size) % self._capacity] = card_id
+        self._size += 1
+
+    def place_ids(self, card_ids):
+        """Places card keys at the end of the desk, in order."""
+        positions = (self._head + self._size + np.arange(len(card_ids))) % self._capacity
+        self._desk[positions] = card_ids
+        for card_id in card_ids.tolist():
+            self._hash_place(card_id)
+            self._size += 1
+
+    def insert_id(self, card_id):
+        """Inserts a card key at the beginning of the desk."""
+        self._hash_insert(card_id)
+        self._head = (self._head - 1) % self._capacity
+        self._desk[self._head] = card_id
+        self._size += 1
+
+    def pop_ids(self, count):
+        """Removes and returns the last count card keys of the desk."""
+        positions = (self._head + self._size - count + np.arange(count)) % self._capacity
+        card_ids = self._desk[positions]
+        for card_id in card_ids.tolist()[::-1]:
+            self._size -= 1
+            self._hash_pop(card_id)
+        return card_ids
 
     def dealCard(self):
         """Deals a card from the top of desk."""
         if not self.empty():
-            return self._desk.pop(0)
+            return self._card(self.deal_id())
         else:
             return None
 
     def placecard(self, card):
         """Places a card at the end of the desk."""
         if isinstance(card, RegicideCard):
-            self._desk.append(card)
+            self.place_id(card.key())
         else:
             raise AssertionError
 
     def insertcard(self, card):
         """Inserts a card at the beginning of the desk."""
         if isinstance(card, RegicideCard):
-            self._desk.insert(0, card)
+            self.insert_id(card.key())
         else:
             raise AssertionError
 
+    def removecard(self, index):
+        """Removes and returns the card at the given index of the desk."""
+        if index < 0:
+            index += self._size
+        if index == 0:
+            return self._card(self.deal_id())
+        if index == self._size - 1:
+            return self._card(int(self.pop_ids(1)[0]))
+        ids = self.ids()
+        self._set_ids(np.delete(ids, index))
+        return self._card(int(ids[index]))
+
+    def _set_ids(self, card_ids, rehash=True):
+        """Replaces the content of the desk with card keys, from the top."""
+        self._head = 0
+        self._size = len(card_ids)
+        self._desk[:self._size] = card_ids
+        if rehash:
+            self._rehash()
+
+    def _load_ids(self, card_ids, hash):
+        """Replaces the content of the desk with card keys whose hash is already known."""
+        self._set_ids(card_ids, rehash=False)
+        self._hash = hash
+
+    def clone(self, rng=None):
+        """Returns a copy of the desk sharing the (immutable) card objects.
+
+        Args:
+            rng: the random Generator of the copy, defaults to this desk's one.
+        """
+        desk = object.__new__(type(self))
+        desk.__dict__.update(self.__dict__)
+        desk._desk = self._desk.copy()
+        if rng is not None:
+            desk._rng = rng
+        return desk
+
     def __str__(self):
-        return "".join([c.__str__() for c in self._desk])
+        return "".join([self.card(i).__str__() for i in range(self._size)])
 
     def __repr__(self):
         return str(self)
 
-    def __len__(self): return len(self._desk)
+    def __len__(self): return self._size
 
 
 class RegicideDrawDesk(RegicideDesk):
-    def __init__(self, game):
+    def __init__(self, game, rng=None):
         """Creates a RegicideDrawDesk object.
 
         Args:
             game: A game instance, containing information about the game configuration.
+            rng: A numpy random Generator used to shuffle the desk.
         """
-        super().__init__(game)
+        super().__init__(game, rng)
         self._num_ranks = game.num_start_ranks()
         self._num_colors = game.num_colors()
+        self._known_top = 0
+        self._known_bottom = 0
         self.setup()
                     
     def setup(self):
         """Sets up the desk in an shuffle case"""
-        for color in range(self._num_colors):
-            for rank in range(self._num_ranks):
-                card = RegicideCard(color, rank)
-                self._desk.append(card)
-                random.shuffle(self._desk)
+        cards = np.array([color * self._game.num_ranks() + rank
+                          for color in self._game.colors()
+                          for rank in range(self._num_ranks)], dtype=np.int8)
+        self._set_ids(cards[self._rng.permutation(len(cards))])
+
+    def known(self):
+        """Returns how many cards at the top and at the bottom of the desk were seen.
+
+        Enemies defeated exactly are put face up on top of the desk, so the
+        players know those cards and their positions. The heart effect
+        shuffles discarded cards in at the bottom, so the players know which
+        cards those are but not their order. The rest of the desk is unseen.
+        """
+        return self._known_top, self._known_bottom
+
+    def set_known(self, known_top, known_bottom):
+        self._known_top = known_top
+        self._known_bottom = known_bottom
+
+    def deal_id(self):
+        card_id = super().deal_id()
+        self._known_top = max(0, self._known_top - 1)
+        self._known_bottom = min(self._known_bottom, self._size)
+        return card_id
+
+    def insert_id(self, card_id):
+        super().insert_id(card_id)
+        self._known_top += 1
+
+    def place_id(self, card_id):
+        super().place_id(card_id)
+        self._known_bottom += 1
+
+    def place_ids(self, card_ids):
+        super().place_ids(card_ids)
+        self._known_bottom += len(card_ids)
+
+    def pop_ids(self, count):
+        card_ids = super().pop_ids(count)
+        self._known_bottom = max(0, self._known_bottom - count)
+        self._known_top = min(self._known_top, self._size)
+        return card_ids
+
+    def _set_ids(self, card_ids, rehash=True):
+        super()._set_ids(card_ids, rehash)
+        self._known_top = 0
+        self._known_bottom = 0
 
 class RegicideDisacrdDesk(RegicideDesk):
-    def __init__(self, game):
+    def __init__(self, game, rng=None):
         """Creates a RegicideDisacrdDesk object.
 
         Args:
             game: A game instance, containing information about the game configuration.
+            rng: A numpy random Generator used by the heart effect draws.
         """
-        super().__init__(game)
+        super().__init__(game, rng)
         self._num_ranks = game.num_ranks()
         self._num_colors = game.num_colors()
+        self._keys = self._zobrist.discard
         self.setup()
+
+    def _hash_deal(self, card_id):
+        self._hash ^= self._keys[card_id]
+
+    def _hash_insert(self, card_id):
+        self._hash ^= self._keys[card_id]
+
+    def _hash_place(self, card_id):
+        self._hash ^= self._keys[card_id]
+
+    def _hash_pop(self, card_id):
+        self._hash ^= self._keys[card_id]
+
+    def _rehash(self):
+        """The discard pile is hashed as a set, independently of its order."""
+        self._hash = 0
+        for card_id in self.ids().tolist():
+            self._hash ^= self._keys[card_id]
         
+    def random_index(self):
+        """Returns a uniformly random index into the desk."""
+        return int(self._rng.integers(self._size))
+
     def random_pop(self):
-        random_index = random.randint(0, len(self._desk) - 1)
-        random_card = self._desk.pop(random_index)
-        return random_card
+        return self.removecard(self.random_index())
+
+    def random_sample(self, count):
+        """Removes count distinct random cards from the desk in one call.
+
+        Args:
+            count: an integer, at most len(self).
+
+        Returns:
+            indices: the positions the cards held in the desk, in pick order.
+            card_ids: the card keys removed, in pick order.
+        """
+        indices = self._rng.choice(self._size, count, replace=False)
+        return indices, self.take_sample(indices)
+
+    def take_sample(self, indices):
+        """Removes the cards at the given positions and returns their keys, in the order of indices."""
+        ids = self.ids()
+        keep = np.ones(self._size, dtype=bool)
+        keep[indices] = False
+        self._set_ids(ids[keep], rehash=False)
+        for card_id in ids[indices].tolist():
+            self._hash ^= self._keys[card_id]
+        return ids[indices]
+
+    def restore_sample(self, indices, card_ids):
+        """Puts back cards removed by random_sample at their former positions."""
+        size = self._size + len(card_ids)
+        restored = np.zeros(size, dtype=np.int8)
+        picked = np.zeros(size, dtype=bool)
+        picked[indices] = True
+        restored[indices] = card_ids
+        restored[~picked] = self.ids()
+        self._set_ids(restored, rehash=False)
+        for card_id in card_ids.tolist():
+            self._hash ^= self._keys[card_id]
 
 
 class RegicideEnemyDesk(RegicideDesk):
-    def __init__(self, game):
+    def __init__(self, game, rng=None):
         """Creates a RegicideEnemyDesk object.
 
         Args:
             game: A game instance, containing information about the game configuration.
+            rng: A numpy random Generator used to shuffle the enemies of each rank.
         """
-        super().__init__(game)
+        super().__init__(game, rng)
         self._num_ranks = game.num_ranks()
         self._num_colors = game.num_colors()
+        # Health and attack of each enemy, indexed by card key.
+        self._health = np.zeros(game.num_cards(), dtype=np.int16)
+        self._attack = np.zeros(game.num_cards(), dtype=np.int16)
+        self._keys = self._zobrist.enemy
+        self._stats_hash = 0
+        self._total_health = 0
+        # RegicideEnemy snapshots by card key, dropped when the enemy's health or attack changes.
+        self._snapshots = {}
         self.setup()
 
-        self.end_enemy = RegicideEnemy(0, 10, 0, 0)
-                    
+    def _card(self, card_id):
+        """Returns a RegicideEnemy snapshot of the enemy with the given key."""
+        enemy = self._snapshots.get(card_id)
+        if enemy is None:
+            color, rank = divmod(card_id, self._num_ranks)
+            enemy = RegicideEnemy(color, rank, int(self._health[card_id]), int(self._attack[card_id]))
+            self._snapshots[card_id] = enemy
+        return enemy
+
+    def hash(self):
+        """Returns the hash of the enemy order and of every enemy's health and attack."""
+        return self._hash ^ self._stats_hash
+
+    def _stats_key(self, card_id):
+        return self._zobrist.enemy_stats(card_id, int(self._health[card_id]), int(self._attack[card_id]))
+
+    def _hash_deal(self, card_id):
+        super()._hash_deal(card_id)
+        self._stats_hash ^= self._stats_key(card_id)
+
+    def _hash_insert(self, card_id):
+        super()._hash_insert(card_id)
+        self._stats_hash ^= self._stats_key(card_id)
+
+    def _hash_place(self, card_id):
+        super()._hash_place(card_id)
+        self._stats_hash ^= self._stats_key(card_id)
+
+    def _hash_pop(self, card_id):
+        super()._hash_pop(card_id)
+        self._stats_hash ^= self._stats_key(card_id)
+
+    def _rehash(self):
+        super()._rehash()
+        self._stats_hash = 0
+        for card_id in self.ids().tolist():
+            self._stats_hash ^= self._stats_key(card_id)
+
     def setup(self):
         """Sets up the desk in an shuffle case with health and attack setting"""
-        for rank in range(10, self._num_ranks):
+        for rank in range(10, 10 + self._game.enemy_levels()):
             health = self._game.enemy_health()[rank - 10]
             attack = self._game.enemy_attack()[rank - 10]
-            tmp_desk = []
-            for color in range(self._num_colors):
-                enemy = RegicideEnemy(color, rank, health, attack)
-                tmp_desk.append(enemy)
-            random.shuffle(tmp_desk)
-            self._desk += tmp_desk
+            for color in self._rng.permutation(np.array(self._game.colors())):
+                card_id = int(color) * self._num_ranks + rank
+                self._health[card_id] = health
+                self._attack[card_id] = attack
+                self.place_id(card_id)
+        self._snapshots.clear()
+
+    def clone(self, rng=None):
+        """Returns a copy of the desk with its own health and attack arrays."""
+        desk = super().clone(rng)
+        desk._health = self._health.copy()
+        desk._attack = self._attack.copy()
+        desk._snapshots = dict(self._snapshots)
+        return desk
+
+    def health(self, card_id):
+        return int(self._health[card_id])
+
+    def attack(self, card_id):
+        return int(self._attack[card_id])
+
+    def set_enemies(self, card_ids, healths, attacks):
+        """Replaces the desk with enemy keys card_ids, from the top, and their health and attack."""
+        self._health[card_ids] = healths
+        self._attack[card_ids] = attacks
+        self._snapshots.clear()
+        self._set_ids(card_ids)
+
+    def load_enemies(self, card_ids, healths, attacks, hash, stats_hash):
+        """Like set_enemies(), with the order and stats hashes already known."""
+        self._health[card_ids] = healths
+        self._attack[card_ids] = attacks
+        self._snapshots.clear()
+        self._load_ids(card_ids, hash)
+        self._stats_hash = stats_hash
+
+    def healths(self, card_ids):
+        """Returns the health of each enemy key in card_ids as an int16 array."""
+        return self._health[card_ids]
+
+    def attacks(self, card_ids):
+        """Returns the attack of each enemy key in card_ids as an int16 array."""
+        return self._attack[card_ids]
+
+    def deal_id(self):
+        card_id = super().deal_id()
+        self._total_health -= int(self._health[card_id])
+        return card_id
+
+    def insert_id(self, card_id):
+        super().insert_id(card_id)
+        self._total_health += int(self._health[card_id])
+
+    def place_id(self, card_id):
+        super().place_id(card_id)
+        self._total_health += int(self._health[card_id])
+
+    def pop_ids(self, count):
+        card_ids = super().pop_ids(count)
+        self._total_health -= int(self._health[card_ids].sum())
+        return card_ids
+
+    def _set_ids(self, card_ids, rehash=True):
+        super()._set_ids(card_ids, rehash)
+        self._total_health = int(self._health[self.ids()].sum())
+
+    def set_health(self, card_id, health):
+        """Sets the health of an enemy in the desk."""
+        self._stats_hash ^= self._stats_key(card_id)
+        self._total_health += health - int(self._health[card_id])
+        self._health[card_id] = health
+        self._snapshots.pop(card_id, None)
+        self._stats_hash ^= self._stats_key(card_id)
+
+    def set_attack(self, card_id, attack):
+        """Sets the attack of an enemy in the desk."""
+        self._stats_hash ^= self._stats_key(card_id)
+        self._attack[card_id] = attack
+        self._snapshots.pop(card_id, None)
+        self._stats_hash ^= self._stats_key(card_id)
 
     def total_health(self):
-        """ return the all enemy's health"""
-        return sum(list(map(lambda x: x.health(), self._desk)))
+        """ return the all enemy's health, kept up to date as the desk changes"""
+        return self._total_health
+
+    def current_enemy_key(self):
+        """Returns the card key of the enemy on top of the desk."""
+        return int(self._desk[self._head])
 
     def current_enemy(self):
         """ return the enemy from the top of desk"""
         if not self.empty():
-            return self._desk[0]
+            return self.card(0)
         else:
             print("You win!")
-            return self.end_enemy
+            return END_ENEMY
             raise RuntimeError
 
     def current_enemy_health(self):
-        return self.current_enemy().health()
+        if self.empty():
+            return self.current_enemy().health()
+        return int(self._health[self._desk[self._head]])
 
     def current_enemy_attack(self):
-        return self.current_enemy().attack()
+        if self.empty():
+            return self.current_enemy().attack()
+        return int(self._attack[self._desk[self._head]])
 
     def current_enemy_color(self):
-        return self.current_enemy().color()
+        if self.empty():
+            return self.current_enemy().color()
+        return int(self._desk[self._head]) // self._num_ranks
 
     def current_enemy_rank(self):
-        return self.current_enemy().rank() - 10
\ No newline at end of file
+        if self.empty():
+            return self.current_enemy().rank() - 10
+        return int(self._desk[self._head]) % self._num_ranks - 10
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Resolvers choosing which cards to discard to survive an enemy attack.
+
+A resolver is called with the cards in hand and the damage to absorb and
+returns the cards to discard. If the hand cannot absorb the damage it
+returns every card, which loses the game.
+"""
+
+
+def min_overkill(cards, demage):
+    """Discards the cards whose total value exceeds the damage the least.
+
+    Among the subsets of least overkill, one with the fewest cards is used.
+    """
+    # Fewest-card subset reaching each total, as a tuple of card indices.
+    best = {0: ()}
+    for i, card in enumerate(cards):
+        for total, subset in list(best.items()):
+            total += card.value()
+            if total not in best or len(subset) + 1 < len(best[total]):
+                best[total] = subset + (i,)
+    totals = [total for total in best if total >= demage]
+    if not totals:
+        return list(cards)
+    return [cards[i] for i in best[min(totals)]]
+
+
+def keep_highest(cards, demage):
+    """Discards the lowest value cards until the damage is absorbed."""
+    discard = []
+    total = 0
+    for card in sorted(cards, key=lambda card: card.value()):
+        if total >= demage:
+            break
+        discard.append(card)
+        total += card.value()
+    return discard
+
+
+DISCARD_RESOLVERS = {
+    "min_overkill": min_overkill,
+    "keep_highest": keep_highest,
+}
+
+
+def get_discard_resolver(resolver):
+    """Returns the resolver function for a name of DISCARD_RESOLVERS or a callable."""
+    if callable(resolver):
+        return resolver
+    if resolver not in DISCARD_RESOLVERS:
+        raise ValueError("Unknown discard resolver %r, expected one of %s."
+                         % (resolver, sorted(DISCARD_RESOLVERS)))
+    return DISCARD_RESOLVERS[resolver]
+
+
+def discard_resolver_name(resolver):
+    """Returns the name resolver is registered under in DISCARD_RESOLVERS, or None."""
+    for name, function in DISCARD_RESOLVERS.items():
+        if function is resolver:
+            return name
+    return None
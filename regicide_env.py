@@ -1,4 +1,5 @@
 from regicide import RegicideGame, RegicideStateType
+from regicide_variants import variant_config
 from gym import spaces
 import numpy as np
 from gym.spaces import Discrete
@@ -69,7 +70,8 @@ class RegicideEnv(Environment):
     ```
     """
 
-    def __init__(self, args, seed = 42):
+    def __init__(self, args, seed = 42, auto_advance = False, discard_resolver = None, seed_bank = None,
+                 worker = 0, num_workers = 1):
         """Creates an environment with the given game configuration.
 
         Args:
@@ -86,34 +88,25 @@ class RegicideEnv(Environment):
                 1: First-order common knowledge observation.
               - seed: int, Random seed.
               - random_start_player: bool, Random start player.
+          auto_advance: bool, whether step() plays forced moves by itself, see
+            step().
+          discard_resolver: None, or a resolver of the DISCARD phase, see
+            RegicideState.set_discard_resolver().
+          seed_bank: None, or a RegicideSeedBank (or the path of one) that
+            reset() deals from instead of shuffling.
+          worker, num_workers: with a seed bank, the environment only uses the
+            deals worker, worker + num_workers, ... of the bank.
         """
         self._seed = seed
         self._count = 0
-        if (args.regicide_name == "Regicide-Single"):
-            config = {
-                "players": 1,
-                "hand_size": 8,
-                "enemy_health": [20,30,40],
-                "enemy_attack": [10,15,20],
-                "yield_enable": True,
-                "maximum_combo": 10,
-                "seed": self._seed
-            }
-        elif (args.regicide_name == "Regicide-Double"):
-            config = {
-                "players": 2,
-                "hand_size": 7,
-                "enemy_health": [20,30,40],
-                "enemy_attack": [10,15,20],
-                "yield_enable": True,
-                "maximum_combo": 10,
-                "seed": self._seed
-            }
-        else:
-            raise ValueError("Unknown environment {}".format(args.regicide_name))
+        self._auto_advance = auto_advance
+        self._discard_resolver = discard_resolver
+        # args.regicide_name is a variant registered in regicide_variants.
+        config = variant_config(args.regicide_name, self._seed)
 
         self.seed(self._seed)
         self.game = RegicideGame(config)
+        self.set_seed_bank(seed_bank, worker, num_workers)
 
         self.players = self.game.num_players()
         self.action_space = []
@@ -130,20 +123,46 @@ class RegicideEnv(Environment):
           
     def seed(self, seed=None):
         if seed is None:
-            np.random.seed(1)
-        else:
-            np.random.seed(seed)
-
-    def reset(self):
+            seed = 1
+        np.random.seed(seed)
+        if hasattr(self, "game"):
+            self.game.seed(seed)
+
+    def set_seed_bank(self, seed_bank, worker=0, num_workers=1):
+        """Makes reset() deal from a seed bank, or shuffle again if seed_bank is None."""
+        if isinstance(seed_bank, str):
+            from regicide_seedbank import RegicideSeedBank
+            seed_bank = RegicideSeedBank.load(seed_bank)
+        if seed_bank is not None:
+            seed_bank.check(self.game)
+            seed_bank = seed_bank.shard(worker, num_workers)
+        self._seed_bank = seed_bank
+        self._bank_index = 0
+
+    def reset(self, index = None):
         """Resets the environment for a new game.
+
+        Args:
+          index: with a seed bank, the deal of the worker's shard to play;
+            by default the deals are played in order, wrapping around.
+            Raises ValueError if it is given without a seed bank.
         """
-        self.state = self.game.new_initial_state()
+        if self._seed_bank is None:
+            if index is not None:
+                raise ValueError("reset() takes an index only with a seed bank.")
+            self.state = self.game.new_initial_state()
+        else:
+            if index is None:
+                index = self._bank_index
+                self._bank_index = (self._bank_index + 1) % len(self._seed_bank)
+            self.state = self._seed_bank.new_state(self.game, index)
+        self.state.set_discard_resolver(self._discard_resolver)
         observation = self._make_observation_all_players()
         current_player = self.state.cur_player()
         observation["current_player"] = current_player
         player_observations = observation['player_observations']
 
-        agent_turn = np.zeros(self.players, dtype=np.int).tolist()
+        agent_turn = np.zeros(self.players, dtype=int).tolist()
         agent_turn[current_player] = 1
 
         available_actions = np.zeros(self.num_moves())
@@ -159,6 +178,11 @@ class RegicideEnv(Environment):
 
     def step(self, action):
         """Take one step in the game.
+
+        With auto_advance, the moves that follow while exactly one move is
+        legal are applied too, until a real choice or the end of the game.
+        The reward is the sum over all the moves applied and info["auto_steps"]
+        is the number of moves applied automatically.
         """
         self._count += 1
         action = int(action[0])
@@ -173,6 +197,15 @@ class RegicideEnv(Environment):
         # Apply the action to the state.
         last_score = self.state.enemy_desk_size()
         self.state.apply_move(action)
+        reward = self.state._reward
+        auto_steps = 0
+        while self._auto_advance and not self.state.is_terminal():
+            legal_moves = np.flatnonzero(self.state.legal_action_mask())
+            if len(legal_moves) != 1:
+                break
+            self.state.apply_move(self.state.get_move(int(legal_moves[0])))
+            reward += self.state._reward
+            auto_steps += 1
 
         observation = self._make_observation_all_players()
         current_player = self.state.cur_player()
@@ -182,7 +215,7 @@ class RegicideEnv(Environment):
         available_actions = np.zeros(self.num_moves())
         available_actions[player_observations[current_player]['legal_moves_as_int']] = 1.0
 
-        agent_turn = np.zeros(self.players, dtype=np.int).tolist()
+        agent_turn = np.zeros(self.players, dtype=int).tolist()
         agent_turn[current_player] = 1
 
         obs = player_observations[current_player]['vectorized'] + agent_turn
@@ -197,12 +230,10 @@ class RegicideEnv(Environment):
         # else:
         #     reward = last_score - self.state.score() 
         
-        reward = self.state._reward
-
         done = self.state.is_terminal()
         # reward = self.state.score() - last_score
         rewards = [[reward]] * self.players
-        infos = {'score': self.state.score()}
+        infos = {'score': self.state.score(), 'auto_steps': auto_steps}
         
         return obs, share_obs, reward, done, infos, available_actions
 
@@ -213,7 +244,7 @@ class RegicideEnv(Environment):
         player_observations = observation['player_observations']
 
 
-        agent_turn = np.zeros(self.players, dtype=np.int).tolist()
+        agent_turn = np.zeros(self.players, dtype=int).tolist()
         agent_turn[current_player] = 1
 
         obs = player_observations[current_player]['vectorized'] + agent_turn
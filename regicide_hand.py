@@ -1,97 +1,268 @@
-from regicide_card import RegicideCard
+class RegicideCardSet(object):
+    """A set of cards stored as a single integer bitmask.
+
+    Bit ``color * num_ranks + rank`` (the card key) is set when the card is in
+    the set, so membership, add and remove are O(1) and iterating the set bits
+    from the lowest upwards yields the cards in ``RegicideCard.key()`` order.
+    Per-rank and per-color counts are kept alongside the bitmask.
+    """
+
+    def __init__(self, num_colors, num_ranks):
+        """Creates an empty RegicideCardSet.
+
+        Args:
+            num_colors: an integer, the number of colors in the game.
+            num_ranks: an integer, the number of ranks in the game.
+        """
+        self._num_colors = num_colors
+        self._num_ranks = num_ranks
+        self._bits = 0
+        self._size = 0
+        self._rank_counts = [0 for _ in range(num_ranks)]
+        self._color_counts = [0 for _ in range(num_colors)]
+
+    def card_id(self, card_info):
+        """Returns the card id for a (rank, color) tuple."""
+        rank, color = card_info
+        return color * self._num_ranks + rank
+
+    def load(self, bits, size, rank_counts, color_counts):
+        """Replaces the set with a bitmask whose size and counts are already known."""
+        self._bits = bits
+        self._size = size
+        self._rank_counts = list(rank_counts)
+        self._color_counts = list(color_counts)
+
+    def copy(self):
+        """Returns an independent copy of the card set."""
+        card_set = object.__new__(type(self))
+        card_set.__dict__.update(self.__dict__)
+        card_set._rank_counts = list(self._rank_counts)
+        card_set._color_counts = list(self._color_counts)
+        return card_set
+
+    def bits(self):
+        """Returns the integer bitmask of the set."""
+        return self._bits
+
+    def contains(self, card_id):
+        return (self._bits >> card_id) & 1 == 1
+
+    def add(self, card_id):
+        """Adds a card id to the set."""
+        bit = 1 << card_id
+        if self._bits & bit:
+            raise ValueError("%d is already in the card set." % card_id)
+        self._bits |= bit
+        self._size += 1
+        self._rank_counts[card_id % self._num_ranks] += 1
+        self._color_counts[card_id // self._num_ranks] += 1
+
+    def remove(self, card_id):
+        """Removes a card id from the set."""
+        bit = 1 << card_id
+        if not self._bits & bit:
+            raise ValueError("%d is not in the card set." % card_id)
+        self._bits ^= bit
+        self._size -= 1
+        self._rank_counts[card_id % self._num_ranks] -= 1
+        self._color_counts[card_id // self._num_ranks] -= 1
+
+    def rank_count(self, rank):
+        """Returns the number of cards of the given rank in the set."""
+        return self._rank_counts[rank]
+
+    def color_count(self, color):
+        """Returns the number of cards of the given color in the set."""
+        return self._color_counts[color]
+
+    def __iter__(self):
+        """Yields the card ids in ascending order."""
+        bits = self._bits
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def __contains__(self, card_id):
+        return self.contains(card_id)
+
+    def __len__(self):
+        return self._size
+
 
 class RegicideHand(object):
-    def __init__(self, game, desk, discard_desk):
+    def __init__(self, game, desk, discard_desk, player=0, full_hands=None):
         """Creates a RegicideHand object.
 
+        The cards are held in a RegicideCardSet, so the hand is always kept in
+        ``RegicideCard.key()`` order.
+
         Args:
             game: A game instance, containing information about the game configuration.
             desk: A desk instance representing the draw pile.
             discard_desk: A desk instance representing the discard pile.
+            player: the index of the player holding the hand, used for hashing.
+            full_hands: an optional one-element list shared by the hands of a
+              state, counting how many of them are full.
         """
         self._desk = desk
         self._discard_desk = discard_desk
         self._game = game
         self._hand_size = game.hand_size()
-        self._hand = [desk.dealCard() for _ in range(game.hand_size())]
+        self._cards = RegicideCardSet(game.num_colors(), game.num_ranks())
+        self._hand = None
+        self._keys = game.zobrist().hand[player]
+        self._hash = 0
+        self._value = 0
+        self._full_hands = full_hands if full_hands is not None else [0]
+        for _ in range(game.hand_size()):
+            self._add(desk.dealCard())
+
+    def _add(self, card):
+        self._cards.add(card.key())
+        self._hash ^= self._keys[card.key()]
+        self._value += card.value()
+        if len(self._cards) == self._hand_size:
+            self._full_hands[0] += 1
+        self._hand = None
+
+    def _remove(self, card_id):
+        if len(self._cards) == self._hand_size:
+            self._full_hands[0] -= 1
+        self._cards.remove(card_id)
+        card = self._game.card(card_id)
+        self._hash ^= self._keys[card_id]
+        self._value -= card.value()
+        self._hand = None
+        return card
+
+    def _set_bits(self, bits):
+        """Replaces the cards in hand with the card keys set in bits."""
+        for card_id in list(self._cards):
+            self._remove(card_id)
+        while bits:
+            low = bits & -bits
+            self._add(self._game.card(low.bit_length() - 1))
+            bits ^= low
+
+    def _load(self, bits, size, hash, value, rank_counts, color_counts):
+        """Replaces the cards in hand without recomputing the hash and totals.
+
+        The caller keeps the full hand counter up to date, see _set_bits().
+        """
+        self._cards.load(bits, size, rank_counts, color_counts)
+        self._hash = hash
+        self._value = value
+        self._hand = None
+
+    def _cards_list(self):
+        """Returns the cards in hand as a list, in key order."""
+        if self._hand is None:
+            self._hand = [self._game.card(card_id) for card_id in self._cards]
+        return self._hand
+
+    def clone(self, desk, discard_desk, full_hands=None):
+        """Returns a copy of the hand drawing from desk and discarding to discard_desk.
+
+        The card flyweights are shared, only the card set is copied.
+        full_hands is the full hand counter of the copy, see __init__.
+        """
+        hand = object.__new__(type(self))
+        hand.__dict__.update(self.__dict__)
+        hand._desk = desk
+        hand._discard_desk = discard_desk
+        hand._cards = self._cards.copy()
+        hand._full_hands = full_hands if full_hands is not None else [int(self.full())]
+        return hand
+
+    def card_set(self):
+        """Returns the RegicideCardSet backing the hand."""
+        return self._cards
+
+    def bits(self):
+        """Returns the integer bitmask of the cards in hand."""
+        return self._cards.bits()
+
+    def hash(self):
+        """Returns the 64-bit hash of the cards in hand."""
+        return self._hash
 
     def total_value(self):
-        """ return the all enemy's health"""
-        return sum(list(map(lambda x: x.value(), self._hand)))
+        """ return the total value of the cards in hand, kept up to date as the hand changes"""
+        return self._value
 
     def valid(self, index):
-        return 0 <= index < len(self._hand)
+        return 0 <= index < len(self._cards)
 
     def card(self, index):
         """Returns the card at the given index in the hand.
         """
-        return self._hand[index]
+        return self._cards_list()[index]
 
     def empty(self):
         """Checks if the hand is empty.
         """
-        return len(self._hand) == 0
+        return len(self._cards) == 0
 
     def full(self):
         """Checks if the hand is full.
         """
-        return len(self._hand) == self._hand_size
+        return len(self._cards) == self._hand_size
 
     def pop(self, i):
         """Pops a card from the hand at the specified index."""
-        if not 0 <= i < len(self._hand):
+        if not 0 <= i < len(self._cards):
             raise ValueError("%d is not a valid card index."%i)
-        card = self._hand.pop(i)
-        return card
+        return self._remove(self._cards_list()[i].key())
 
     def removefromhand(self, card):
         """remove the specified card from the hand."""
-        if not card in self._hand:
+        if not self._cards.contains(card.key()):
             raise ValueError("%s is not a valid card index."%card)
-        card = self._hand.remove(card)
-        return card
+        return self._remove(card.key())
 
-    def addcard(self, card): 
+    def addcard(self, card):
         """Appends the specified card to the hand."""
-        self._hand.append(c)
+        self._add(card)
 
     def drawcard(self):
-        """Draws a card from the desk and adds it to the hand if it's not full."""
+        """Draws a card from the desk and adds it to the hand if it's not full.
+
+        Returns the card drawn, or None if no card was drawn.
+        """
         if self._desk.empty() or self.full() :
-            return
+            return None
         card = self._desk.dealCard()
-        self._hand.append(card)
+        self._add(card)
+        return card
 
     def discardcard(self, i):
         """Discards a card from the hand to the discard desk."""
-        if not 0 <= i < len(self._hand):
-            raise ValueError("%d is not a valid card index."%i)
-        card = self._hand.pop(i)
+        card = self.pop(i)
         self._discard_desk.placecard(card)
         return card
 
     def card_in_hand(self, card_info):
         """Check whether the specified card is hold in hand."""
-        for card in self._hand:
-            if card.info() == card_info:
-                return True
-        return False
+        return self._cards.contains(self._cards.card_id(card_info))
 
     def pop_card_in_hand(self, card_info):
         """pop the specified card from hand."""
-        for i in range(len(self._hand)):
-            if self._hand[i].info() == card_info:
-                card = self._hand.pop(i)
-                return card
-        return False
+        card_id = self._cards.card_id(card_info)
+        if not self._cards.contains(card_id):
+            return False
+        return self._remove(card_id)
 
-    def sort(self): self._hand.sort(key=lambda card: card.key())
+    def sort(self):
+        """The hand is always kept in key order, so there is nothing to do."""
+        return
 
-    def __len__(self): 
-        return len(self._hand)
+    def __len__(self):
+        return len(self._cards)
 
     def __str__(self):
-        return "".join([c.__str__() + '|' for c in self._hand])
+        return "".join([c.__str__() + '|' for c in self._cards_list()])
 
     def __repr__(self):
-        return str(self)
\ No newline at end of file
+        return str(self)
@@ -0,0 +1,63 @@
+"""Zobrist-style keys for incrementally hashing Regicide states."""
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+
+
+def splitmix64(x):
+    """Returns the SplitMix64 finalizer of a 64-bit integer."""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+class RegicideZobrist(object):
+    """Random 64-bit keys shared by all states of a RegicideGame.
+
+    Unordered collections (hands and the discard pile) are hashed by XOR of
+    per-card keys. Ordered piles (the draw pile and the enemy desk) use a
+    polynomial hash sum(key[c_i] * base**i) mod 2**64 where i counts from the
+    top, so dealing from the top, inserting at the top and placing at the
+    bottom are all O(1) updates and the hash does not depend on where the
+    pile starts in its ring buffer.
+    """
+
+    def __init__(self, num_players, num_cards, capacity, seed=0x5EED):
+        """Creates the key tables.
+
+        Args:
+            num_players: the number of hands to create keys for.
+            num_cards: the number of card keys.
+            capacity: the maximum number of cards in an ordered pile.
+            seed: the seed of the keys; states only compare within one seed.
+        """
+        rng = np.random.default_rng(seed)
+
+        def keys(*shape):
+            return rng.integers(1, MASK64, size=shape, dtype=np.uint64, endpoint=True).tolist()
+
+        self.hand = keys(num_players, num_cards)
+        self.draw = keys(num_cards)
+        self.discard = keys(num_cards)
+        self.enemy = keys(num_cards)
+        self._salt = keys(1)[0]
+        self.base = keys(1)[0] | 1
+        self.inverse_base = pow(self.base, -1, 1 << 64)
+        self.power = [pow(self.base, i, 1 << 64) for i in range(capacity + 1)]
+
+    def scalar(self, tag, value):
+        """Returns the key of an integer field, such as the damage or state type."""
+        return splitmix64(self._salt ^ (tag << 48) ^ (value & 0xFFFFFFFFFFFF))
+
+    def enemy_stats(self, card_id, health, attack):
+        """Returns the key of an enemy's current health and attack."""
+        return splitmix64(self._salt ^ (0xE << 60) ^ (card_id << 32) ^
+                          ((health & 0xFFFF) << 16) ^ (attack & 0xFFFF))
+
+    def ordered(self, keys, card_ids):
+        """Returns the polynomial hash of card_ids, from the top, from scratch."""
+        value = 0
+        for i, card_id in enumerate(card_ids):
+            value = (value + keys[card_id] * self.power[i]) & MASK64
+        return value
@@ -0,0 +1,278 @@
+"""Determinized Monte Carlo tree search agent over RegicideState.
+
+The acting player does not see the order of the draw pile, the other hands
+or the enemies behind the current one. The agent samples determinizations
+of those with RegicideState.sample_determinizations(), runs UCT on each of
+them as a game of perfect information, and plays the move with the most
+root visits summed over all the trees.
+
+Trees live in preallocated arrays, so a search never holds more than
+max_nodes nodes. The children of a node are allocated as one block when it
+is expanded; once the arrays are full, leaves are no longer expanded and
+are evaluated by their rollout only.
+
+Simulations run in batches that take the trees in turn: the leaves of a
+batch are played out together by regicide_playout.playout_states(), in one
+vectorized pass, and virtual loss spreads the simulations of one tree over
+different leaves while they wait. The playouts play the DISCARD phase with
+the rollout policy, whether or not the state has a discard resolver.
+"""
+import concurrent.futures
+import time
+
+import numpy as np
+
+from regicide import RegicideGame, RegicideStateType, unpack_states
+from regicide_discard import discard_resolver_name
+from regicide_move import greedy_scores
+from regicide_playout import PLAYOUT_POLICIES, playout_states
+
+MCTS_ROLLOUTS = PLAYOUT_POLICIES
+
+# Games of each configuration, built once per worker process.
+_WORKER_GAMES = {}
+
+
+class _Forest(object):
+    """Array-backed storage of one UCT tree per determinization."""
+
+    def __init__(self, num_trees, max_nodes):
+        capacity = max(1, max_nodes // num_trees)
+        self.capacity = capacity
+        size = num_trees * capacity
+        self.move = np.full(size, -1, dtype=np.int16)
+        self.first_child = np.full(size, -1, dtype=np.int32)
+        self.num_children = np.zeros(size, dtype=np.int16)
+        self.visits = np.zeros(size, dtype=np.int32)
+        self.value = np.zeros(size, dtype=np.float64)
+        # Next free node of each tree; node tree * capacity is its root.
+        self.free = np.arange(num_trees) * capacity + 1
+
+    def root(self, tree):
+        return tree * self.capacity
+
+    def allocate(self, tree, count):
+        """Returns the first of count new nodes of tree, or -1 if it is full."""
+        first = int(self.free[tree])
+        if first + count > (tree + 1) * self.capacity:
+            return -1
+        self.free[tree] += count
+        return first
+
+
+class RegicideMCTS(object):
+    """Information-set search by determinized UCT with root visit aggregation.
+
+    Values are from the players' common point of view: 1 for a win,
+    otherwise the fraction of the enemies defeated.
+    """
+
+    def __init__(self, game, determinizations=8, simulations=1000, time_ms=None, max_nodes=100000,
+                 exploration=1.0, rollout="greedy", batch_size=64, workers=1, seed=None):
+        """Creates an agent.
+
+        Args:
+            game: the RegicideGame being played.
+            determinizations: the number of sampled states searched per move.
+            simulations: the number of simulations per move, shared by the
+              determinizations, or None for no limit.
+            time_ms: the wall-clock budget per move in milliseconds, or None
+              for no limit, checked between batches. At least one of
+              simulations and time_ms is set.
+            max_nodes: the maximum number of tree nodes per move, shared by
+              the determinizations.
+            exploration: the UCT exploration constant.
+            rollout: "uniform" or "greedy", the regicide_playout policy
+              playing the games out from the leaves.
+            batch_size: the number of leaves played out together.
+            workers: the number of processes the determinizations are split
+              across; 1 searches in this process. With more workers, the
+              discard resolver of the searched states must be one of
+              regicide_discard.DISCARD_RESOLVERS, which are sent by name.
+            seed: an optional seed of the determinizations and rollouts.
+        """
+        if simulations is None and time_ms is None:
+            raise ValueError("Set a simulation budget, a time budget or both.")
+        if rollout not in MCTS_ROLLOUTS:
+            raise ValueError("Unknown rollout policy %r, expected one of %s." % (rollout, MCTS_ROLLOUTS))
+        if determinizations < 1 or workers < 1 or batch_size < 1:
+            raise ValueError("determinizations, batch_size and workers must be positive.")
+        self._game = game
+        self._determinizations = determinizations
+        self._simulations = simulations
+        self._time_ms = time_ms
+        self._max_nodes = max_nodes
+        self._exploration = exploration
+        self._rollout = rollout
+        self._batch_size = batch_size
+        self._workers = workers
+        self._rng = np.random.default_rng(seed)
+        self._pool = None
+
+    def search(self, state):
+        """Returns the root visits of each move id, summed over the determinizations.
+
+        Args:
+            state: the RegicideState to move in; it is not modified.
+
+        Returns:
+            An int64 array of length game.max_moves(), zero for illegal moves.
+        """
+        if state.is_terminal() or state.is_chance_node():
+            raise ValueError("The state has no move to search.")
+        resolver = state._discard_resolver
+        if self._workers > 1 and resolver is not None:
+            # Functions such as lambdas do not pickle, so workers look resolvers up by name.
+            name = discard_resolver_name(resolver)
+            if name is None:
+                raise ValueError("Searching with workers > 1 needs a discard resolver registered in "
+                                 "regicide_discard.DISCARD_RESOLVERS, got %r." % (resolver,))
+            resolver = name
+        records = state.sample_determinizations(self._determinizations, seed=self._rng.integers(1 << 63))
+        if self._workers == 1:
+            return _search(self._game, records, resolver, self._simulations, self._time_ms,
+                           self._max_nodes, self._exploration, self._rollout, self._batch_size,
+                           self._rng.integers(1 << 63))
+
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self._workers)
+        chunks = np.array_split(np.arange(len(records)), min(self._workers, len(records)))
+        futures = []
+        for chunk in chunks:
+            share = len(chunk) / len(records)
+            simulations = None if self._simulations is None else max(1, int(self._simulations * share))
+            futures.append(self._pool.submit(
+                _search_worker, self._game._params, records[chunk], resolver, simulations, self._time_ms,
+                max(1, int(self._max_nodes * share)), self._exploration, self._rollout, self._batch_size,
+                self._rng.integers(1 << 63)))
+        return sum(future.result() for future in futures)
+
+    def select_move(self, state):
+        """Returns the id of the legal move with the most root visits.
+
+        If no move was visited, for instance when max_nodes is too small to
+        expand the roots, the move the greedy heuristic ranks first is
+        returned.
+        """
+        visits = self.search(state)
+        mask = state.legal_action_mask()
+        if not visits[mask].any():
+            return int(_greedy_order(state, state.legal_moves_as_int())[0])
+        return int(np.argmax(np.where(mask, visits, -1)))
+
+    def close(self):
+        """Shuts the worker processes down."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def _search_worker(params, records, resolver, simulations, time_ms, max_nodes, exploration, rollout,
+                   batch_size, seed):
+    """Runs _search in a worker process, building the game once per process.
+
+    resolver is None or a name of regicide_discard.DISCARD_RESOLVERS.
+    """
+    key = repr(sorted(params.items()))
+    if key not in _WORKER_GAMES:
+        _WORKER_GAMES[key] = RegicideGame(params)
+    return _search(_WORKER_GAMES[key], records, resolver, simulations, time_ms, max_nodes, exploration,
+                   rollout, batch_size, seed)
+
+
+def _search(game, records, resolver, simulations, time_ms, max_nodes, exploration, rollout, batch_size,
+            seed):
+    """Runs UCT on each determinization, one simulation per tree in turn."""
+    roots = unpack_states(game, records)
+    for root in roots:
+        root.set_discard_resolver(resolver)
+    rng = np.random.default_rng(seed)
+    forest = _Forest(len(roots), max_nodes)
+    # Roots are expanded up front, so even a single simulation per tree visits a move.
+    for tree, root in enumerate(roots):
+        _expand(forest, tree, forest.root(tree), root)
+    deadline = None if time_ms is None else time.perf_counter() + time_ms / 1000.0
+    count = 0
+    while simulations is None or count < simulations:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        size = batch_size if simulations is None else min(batch_size, simulations - count)
+        paths, leaves = [], []
+        for i in range(size):
+            tree = (count + i) % len(roots)
+            state = roots[tree].clone()
+            path = _descend(forest, tree, state, exploration)
+            # Virtual loss: the visit counts now, the value once the playout is done.
+            forest.visits[path] += 1
+            paths.append(path)
+            leaves.append(state)
+        result = playout_states(game, leaves, rollout, rng.integers(1 << 63))
+        # The fraction of the enemies defeated, 1 for a win.
+        for path, defeated in zip(paths, result.enemies_defeated):
+            forest.value[path] += defeated / game.num_enemies()
+        count += size
+
+    visits = np.zeros(game.max_moves(), dtype=np.int64)
+    for tree in range(len(roots)):
+        root = forest.root(tree)
+        first = forest.first_child[root]
+        if first < 0:
+            continue
+        children = slice(first, first + forest.num_children[root])
+        np.add.at(visits, forest.move[children], forest.visits[children])
+    return visits
+
+
+def _descend(forest, tree, state, exploration):
+    """Runs the selection and expansion of a simulation of tree.
+
+    Plays the moves from the root to the new leaf on state and returns the
+    path of nodes to back the playout's value up.
+    """
+    node = forest.root(tree)
+    path = [node]
+    while forest.first_child[node] >= 0 and not state.is_terminal():
+        first = forest.first_child[node]
+        children = slice(first, first + forest.num_children[node])
+        visits = forest.visits[children]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited):
+            child = first + unvisited[0]
+        else:
+            ucb = forest.value[children] / visits + \
+                  exploration * np.sqrt(np.log(forest.visits[node]) / visits)
+            child = first + int(np.argmax(ucb))
+        state.apply_move(state.get_move(int(forest.move[child])))
+        node = child
+        path.append(node)
+
+    if not state.is_terminal() and forest.visits[node] > 0:
+        first = _expand(forest, tree, node, state)
+        if first >= 0:
+            state.apply_move(state.get_move(int(forest.move[first])))
+            path.append(first)
+
+    return path
+
+
+def _expand(forest, tree, node, state):
+    """Adds the legal moves of state as children of node, best first for the greedy heuristic.
+
+    Returns the first child, or -1 if the tree is full.
+    """
+    moves = _greedy_order(state, state.legal_moves_as_int())
+    first = forest.allocate(tree, len(moves))
+    if first >= 0:
+        forest.move[first:first + len(moves)] = moves
+        forest.first_child[node] = first
+        forest.num_children[node] = len(moves)
+    return first
+
+
+def _greedy_order(state, moves):
+    """Returns the move ids of moves from the best for the greedy heuristic."""
+    moves = np.asarray(moves, dtype=np.intp)
+    values, clubs = state._game.move_values()
+    score = greedy_scores(values[moves], clubs[moves], state.cur_state() == RegicideStateType.DISCARD,
+                          state.demage(), state.current_enemy_color(), state.current_enemy_health())
+    return moves[np.argsort(-score, kind="stable")]
@@ -1,5 +1,7 @@
 import enum
 
+import numpy as np
+
 class RegicideMoveType(enum.IntEnum):
     """Move types."""
     INVALID = 0
@@ -229,4 +231,120 @@ class RegicideMoveCombo(RegicideMove):
         move_dict["move"] = self._move
         move_dict["combo_list"] = self._play_list
 
-        return move_dict
\ No newline at end of file
+        return move_dict
+
+
+_MOVE_TABLES = {}
+
+
+def greedy_scores(values, clubs, discarding, demage, enemy_color, enemy_health):
+    """Scores moves for the greedy heuristic, the best move scoring highest.
+
+    In PLAY the cheapest move that defeats the current enemy comes first,
+    then the moves dealing the most damage; clubs deal double damage unless
+    the enemy is a club. In DISCARD the cheapest card that covers the damage
+    comes first, then the most valuable cards. The arguments broadcast, so
+    one call scores the moves of a single state or of a batch of games.
+
+    Args:
+        values, clubs: per move, see RegicideMoveTable.move_values().
+        discarding: whether the game is in the DISCARD phase.
+        demage: the damage to discard.
+        enemy_color, enemy_health: the current enemy's color and health.
+    """
+    attack = np.where(clubs & (enemy_color != 3), values * 2, values)
+    play_score = np.where(attack >= enemy_health, 1000 - attack, attack)
+    discard_score = np.where(values >= demage, 1000 - values, values)
+    return np.where(discarding, discard_score, play_score)
+
+
+def move_table(num_colors, num_ranks, max_moves):
+    """Returns the shared RegicideMoveTable of a move configuration.
+
+    Tables are immutable and interned, so every game with the same
+    configuration shares one table.
+    """
+    key = (num_colors, num_ranks, max_moves)
+    if key not in _MOVE_TABLES:
+        _MOVE_TABLES[key] = RegicideMoveTable(num_colors, num_ranks, max_moves)
+    return _MOVE_TABLES[key]
+
+
+class RegicideMoveTable(object):
+    """All moves of a game, built once and indexed by move id.
+
+    Besides the move objects the table holds parallel read-only arrays so
+    that vectorized code never has to touch them:
+        types: int8 RegicideMoveType of each move.
+        card_ids: the card key of the played or discarded card; the first
+          card of a combo.
+        ace_ids: the card key of the ace of ACE moves, num_cards otherwise.
+        combo_ids: (max_moves, 4) card keys of COMBO moves, padded with
+          num_cards.
+        required_ids: (max_moves, 4) every card key a move needs in hand,
+          padded with num_cards. ACE moves that pair an ace with itself
+          require nothing and are marked in self_aces.
+    """
+
+    def __init__(self, num_colors, num_ranks, max_moves):
+        num_cards = num_colors * num_ranks
+        generator = RegicideMoveGenerator(num_colors, num_ranks)
+        self._moves = tuple(generator.generate(move_id) for move_id in range(max_moves))
+        self._num_cards = num_cards
+        self._num_ranks = num_ranks
+
+        self.types = np.zeros(max_moves, dtype=np.int8)
+        self.card_ids = np.full(max_moves, num_cards, dtype=np.intp)
+        self.ace_ids = np.full(max_moves, num_cards, dtype=np.intp)
+        self.combo_ids = np.full((max_moves, 4), num_cards, dtype=np.intp)
+        self.required_ids = np.full((max_moves, 4), num_cards, dtype=np.intp)
+        self.self_aces = np.zeros(max_moves, dtype=bool)
+        for move_id, move in enumerate(self._moves):
+            self.types[move_id] = move.type()
+            if move.type() == RegicideMoveType.COMBO:
+                ids = [color * num_ranks + rank for rank, color in move.combo_list()]
+                self.combo_ids[move_id, :len(ids)] = ids
+            else:
+                rank, color = move.info()
+                ids = [color * num_ranks + rank]
+            self.card_ids[move_id] = ids[0]
+            if move.type() == RegicideMoveType.ACE:
+                rank, color = move.ace_info()
+                self.ace_ids[move_id] = color * num_ranks + rank
+                if self.ace_ids[move_id] == ids[0]:
+                    self.self_aces[move_id] = True
+                    continue
+                ids = [self.ace_ids[move_id]] + ids
+            self.required_ids[move_id, :len(ids)] = ids
+        for array in (self.types, self.card_ids, self.ace_ids, self.combo_ids,
+                      self.required_ids, self.self_aces):
+            array.flags.writeable = False
+
+    def move(self, move_id):
+        """Returns the shared move object of a move id."""
+        return self._moves[move_id]
+
+    def move_values(self, card_values):
+        """Returns the total value of the cards each move needs and whether one is a club.
+
+        Args:
+            card_values: the value of each card key.
+
+        Returns:
+            values: int64 array of shape (max_moves,).
+            clubs: bool array of shape (max_moves,).
+        """
+        # Padded entries of required_ids point at num_cards and are worth nothing.
+        values = np.append(np.asarray(card_values, dtype=np.int64), 0)
+        clubs = np.append(np.arange(self._num_cards) // self._num_ranks == 3, False)
+        return values[self.required_ids].sum(axis=1), clubs[self.required_ids].any(axis=1)
+
+    def moves(self):
+        """Returns the tuple of all moves, indexed by move id."""
+        return self._moves
+
+    def __getitem__(self, move_id):
+        return self._moves[move_id]
+
+    def __len__(self):
+        return len(self._moves)
@@ -0,0 +1,99 @@
+"""Vectorized random and heuristic playouts for value estimation."""
+import collections
+
+import numpy as np
+
+from regicide import RegicideStateType
+from regicide_batch import RegicideBatchState
+from regicide_move import greedy_scores
+
+PLAYOUT_POLICIES = ("uniform", "greedy")
+
+PlayoutResult = collections.namedtuple("PlayoutResult", ["wins", "enemies_defeated", "turns"])
+
+
+def _uniform_actions(batch, rows, masks, rng):
+    """Picks a uniformly random legal move for the given games."""
+    keys = rng.random(masks.shape)
+    keys[~masks] = -1
+    return keys.argmax(axis=1)
+
+
+def _greedy_actions(batch, rows, masks, rng):
+    """Picks a heuristic move for the given games.
+
+    In PLAY the cheapest move that defeats the current enemy is preferred,
+    otherwise the move dealing the most damage. In DISCARD the cheapest card
+    that covers the damage is preferred, otherwise the most valuable card.
+    Ties are broken at random.
+    """
+    values, clubs = batch._game.move_values()
+    score = greedy_scores(values[None, :], clubs[None, :],
+                          (batch._cur_state[rows] == RegicideStateType.DISCARD)[:, None],
+                          batch._demage[rows, None], batch.current_enemy_color()[rows, None],
+                          batch.current_enemy_health()[rows, None]).astype(np.float64)
+    score += rng.random(masks.shape) * 0.5
+    score[~masks] = -np.inf
+    return score.argmax(axis=1)
+
+
+_POLICY_ACTIONS = {"uniform": _uniform_actions, "greedy": _greedy_actions}
+
+
+def playout(state, policy="uniform", n=1, seed=None):
+    """Plays n games from state to the end and reports how they went.
+
+    The games run together in a RegicideBatchState, so every step is a few
+    vectorized operations over all unfinished games rather than n calls to
+    RegicideState.legal_moves() and apply_move(). The state is not modified.
+
+    Args:
+        state: the RegicideState to start from.
+        policy: "uniform" for uniformly random legal moves, or "greedy" for
+          the heuristic of _greedy_actions.
+        n: an integer, the number of playouts.
+        seed: an optional seed for the moves and the heart effect draws.
+
+    Returns:
+        A PlayoutResult of arrays of shape (n,): wins, a bool array; and
+        enemies_defeated and turns, int arrays counting the enemies defeated
+        since the start of the game and the moves made by the playout.
+    """
+    rng = np.random.default_rng(seed)
+    batch = RegicideBatchState.from_state(state._game, state, n, rng.integers(1 << 63))
+    return _play(batch, policy, rng)
+
+
+def playout_states(game, states, policy="uniform", seed=None):
+    """Plays each of states to the end once, all together in one batch.
+
+    Args:
+        game: the RegicideGame the states belong to.
+        states: a list of RegicideState objects; they are not modified.
+        policy: "uniform" or "greedy", see playout().
+        seed: an optional seed for the moves and the heart effect draws.
+
+    Returns:
+        A PlayoutResult of arrays of shape (len(states),), see playout().
+    """
+    rng = np.random.default_rng(seed)
+    batch = RegicideBatchState.from_states(game, states, rng.integers(1 << 63))
+    return _play(batch, policy, rng)
+
+
+def _play(batch, policy, rng):
+    """Plays every game of batch to the end with policy."""
+    if policy not in _POLICY_ACTIONS:
+        raise ValueError("Unknown playout policy %r, expected one of %s." % (policy, PLAYOUT_POLICIES))
+    choose = _POLICY_ACTIONS[policy]
+    n = batch.batch_size()
+    turns = np.zeros(n, dtype=np.int64)
+    active = ~batch.is_terminal()
+    while active.any():
+        actions = np.zeros(n, dtype=np.int64)
+        rows = np.flatnonzero(active)
+        actions[rows] = choose(batch, rows, batch.legal_masks()[rows], rng)
+        batch.apply_moves(actions)
+        turns[rows] += 1
+        active = ~batch.is_terminal()
+    return PlayoutResult(batch.is_win(), batch.enemies_defeated(), turns)
@@ -0,0 +1,302 @@
+"""Policy-guided Monte Carlo tree search with batched network evaluation.
+
+A trained RecurrentMaskableActorCriticPolicy gives the priors of the moves
+and the values of the leaves, AlphaZero-style. Leaves are not evaluated one
+at a time: every tree, over all the determinizations of all the games being
+searched, adds its next leaf to a shared queue, and the queue is evaluated
+with a single forward pass once it holds batch_size leaves or its oldest
+leaf has waited max_wait_ms. Virtual loss spreads the simulations of a tree
+over different leaves while they wait.
+
+The policy is recurrent, so every node keeps the LSTM states after its own
+observation, which are the input states of its children's evaluation. LSTM
+states are passed around as float32 arrays of shape
+(4, n_lstm_layers, n, lstm_hidden_size): the actor's hidden and cell states,
+then the critic's.
+"""
+import time
+
+import numpy as np
+import torch as th
+from sb3_contrib.common.recurrent.type_aliases import RNNStates
+
+from regicide import unpack_states
+from regicide_batch import RegicideBatchState
+
+
+def evaluate_states(policy, observations, action_masks, lstm_states, episode_starts):
+    """Runs one forward pass of a RecurrentMaskableActorCriticPolicy over a batch.
+
+    Args:
+        policy: the RecurrentMaskableActorCriticPolicy.
+        observations: a float32 array of shape (n, observation size).
+        action_masks: a bool array of shape (n, max_moves).
+        lstm_states: the input LSTM states of the n observations.
+        episode_starts: a float32 array of shape (n,), 1 to reset the LSTM
+          states of that observation.
+
+    Returns:
+        priors: the masked move probabilities, of shape (n, max_moves).
+        values: the value estimates, of shape (n,).
+        lstm_states: the LSTM states after the observations.
+    """
+    policy.set_training_mode(False)
+    device = policy.device
+    with th.no_grad():
+        obs = th.as_tensor(observations, dtype=th.float32, device=device)
+        states = th.as_tensor(lstm_states, dtype=th.float32, device=device)
+        starts = th.as_tensor(episode_starts, dtype=th.float32, device=device)
+        distribution, values, out = policy.get_distribution_and_values(
+            obs, RNNStates((states[0], states[1]), (states[2], states[3])), starts, action_masks)
+        priors = distribution.distribution.probs
+        out = th.stack([out.pi[0], out.pi[1], out.vf[0], out.vf[1]])
+    return priors.cpu().numpy(), values.flatten().cpu().numpy(), out.cpu().numpy()
+
+
+class _PolicyForest(object):
+    """Array-backed storage of the trees of a search, with LSTM states per node."""
+
+    def __init__(self, num_trees, max_nodes, lstm_shape):
+        capacity = max(1, max_nodes // num_trees)
+        self.capacity = capacity
+        size = num_trees * capacity
+        self.move = np.full(size, -1, dtype=np.int16)
+        self.first_child = np.full(size, -1, dtype=np.int32)
+        self.num_children = np.zeros(size, dtype=np.int16)
+        self.prior = np.zeros(size, dtype=np.float32)
+        self.reward = np.zeros(size, dtype=np.float64)
+        self.visits = np.zeros(size, dtype=np.int32)
+        self.virtual = np.zeros(size, dtype=np.int32)
+        self.value = np.zeros(size, dtype=np.float64)
+        # LSTM states after each node's observation: (4, layers, node, hidden).
+        self.lstm = np.zeros((4, lstm_shape[0], size, lstm_shape[1]), dtype=np.float32)
+        self.free = np.arange(num_trees) * capacity + 1
+        # Bounds of the mean values seen in each tree, to normalize them.
+        self.low = np.full(num_trees, np.inf)
+        self.high = np.full(num_trees, -np.inf)
+
+    def root(self, tree):
+        return tree * self.capacity
+
+    def allocate(self, tree, count):
+        """Returns the first of count new nodes of tree, or -1 if it is full."""
+        first = int(self.free[tree])
+        if first + count > (tree + 1) * self.capacity:
+            return -1
+        self.free[tree] += count
+        return first
+
+
+class PolicyGuidedMCTS(object):
+    """PUCT search with a recurrent policy's priors and values.
+
+    Values are the discounted returns of the environment rewards the policy
+    was trained on: an edge is worth its move's reward plus gamma times the
+    value of the node it leads to, and a leaf is worth the policy's value
+    estimate, or 0 at the end of the game.
+    """
+
+    def __init__(self, policy, game, simulations=100, batch_size=32, max_wait_ms=10.0, determinizations=1,
+                 c_puct=1.5, gamma=0.4, max_nodes=20000, seed=None):
+        """Creates a search driver.
+
+        Args:
+            policy: a trained RecurrentMaskableActorCriticPolicy.
+            game: the RegicideGame being played.
+            simulations: the number of simulations per game and determinization.
+            batch_size: the number of leaves evaluated by one forward pass.
+            max_wait_ms: the longest a leaf waits for its batch to fill up
+              before the batch is evaluated anyway.
+            determinizations: the number of sampled states searched per game,
+              see RegicideState.sample_determinizations().
+            c_puct: the exploration constant of PUCT.
+            gamma: the discount of the rewards, the one the policy was trained with.
+            max_nodes: the maximum number of tree nodes of a search, shared by
+              all the trees. Each node also keeps 4 LSTM state vectors.
+            seed: an optional seed of the determinizations.
+        """
+        if batch_size < 1 or simulations < 1 or determinizations < 1:
+            raise ValueError("simulations, batch_size and determinizations must be positive.")
+        self._policy = policy
+        self._game = game
+        self._simulations = simulations
+        self._batch_size = batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._determinizations = determinizations
+        self._c_puct = c_puct
+        self._gamma = gamma
+        self._max_nodes = max_nodes
+        self._rng = np.random.default_rng(seed)
+        layers, _, hidden = policy.lstm_hidden_state_shape
+        self._lstm_shape = (layers, hidden)
+        self._evaluate = lambda *args: evaluate_states(policy, *args)
+        self.forward_passes = 0
+
+    @classmethod
+    def from_model(cls, model, game, **kwargs):
+        """Creates a search driver for the policy and discount of a RecurrentMaskablePPO model."""
+        kwargs.setdefault("gamma", model.gamma)
+        return cls(model.policy, game, **kwargs)
+
+    def initial_lstm_states(self, n=1):
+        """Returns zero LSTM states for n games."""
+        return np.zeros((4, self._lstm_shape[0], n, self._lstm_shape[1]), dtype=np.float32)
+
+    def search(self, state, lstm_states=None, episode_start=False):
+        """Searches one game; see search_many().
+
+        Returns:
+            The root visits of each move id, and the LSTM states after the
+            state's observation.
+        """
+        visits, lstm_states = self.search_many(
+            [state], lstm_states, None if not episode_start else np.ones(1, dtype=bool))
+        return visits[0], lstm_states
+
+    def search_many(self, states, lstm_states=None, episode_starts=None):
+        """Searches several games at once, sharing the forward passes.
+
+        Args:
+            states: the RegicideStates to move in; they are not modified.
+            lstm_states: the LSTM states before each state's observation, as
+              returned by the previous search of that game, or None for zeros.
+            episode_starts: an optional bool array, True for games whose
+              LSTM states are reset, at their first move.
+
+        Returns:
+            visits: an int64 array of shape (len(states), max_moves), the
+              root visits of each move summed over the determinizations.
+            lstm_states: the LSTM states after each state's observation, to
+              pass to the next search of that game.
+        """
+        game = self._game
+        num_games = len(states)
+        num_trees = num_games * self._determinizations
+        if lstm_states is None:
+            lstm_states = self.initial_lstm_states(num_games)
+        episode_starts = np.zeros(num_games, dtype=bool) if episode_starts is None else np.asarray(episode_starts)
+        roots = []
+        for state in states:
+            if state.is_terminal() or state.is_chance_node():
+                raise ValueError("The state has no move to search.")
+            records = state.sample_determinizations(self._determinizations, seed=self._rng.integers(1 << 63))
+            for root in unpack_states(game, records):
+                root.set_discard_resolver(state._discard_resolver)
+                roots.append(root)
+        forest = _PolicyForest(num_trees, self._max_nodes, self._lstm_shape)
+        # Leaves waiting for the network: node -> (tree, state, path).
+        pending = {}
+        wait_start = None
+        started = np.zeros(num_trees, dtype=np.int64)
+
+        # The roots are evaluated first, to expand them and get their LSTM states.
+        for tree in range(num_trees):
+            pending[forest.root(tree)] = (tree, roots[tree].clone(), None)
+        self._flush(forest, pending, lstm_states, episode_starts)
+        while (started < self._simulations).any() or pending:
+            blocked = True
+            for tree in np.flatnonzero(started < self._simulations):
+                node, path, state = self._select(forest, tree, roots[tree].clone())
+                if node in pending:
+                    continue
+                blocked = False
+                started[tree] += 1
+                forest.virtual[path] += 1
+                if state.is_terminal():
+                    self._backup(forest, tree, path, 0.0)
+                    continue
+                pending[node] = (tree, state, path)
+                if wait_start is None:
+                    wait_start = time.perf_counter()
+                if len(pending) >= self._batch_size or time.perf_counter() - wait_start >= self._max_wait:
+                    self._flush(forest, pending, lstm_states, episode_starts)
+                    wait_start = None
+            if blocked and pending:
+                self._flush(forest, pending, lstm_states, episode_starts)
+                wait_start = None
+
+        visits = np.zeros((num_games, game.max_moves()), dtype=np.int64)
+        for tree in range(num_trees):
+            root = forest.root(tree)
+            first = forest.first_child[root]
+            if first < 0:
+                continue
+            children = slice(first, first + forest.num_children[root])
+            np.add.at(visits[tree // self._determinizations], forest.move[children], forest.visits[children])
+        root_ids = [forest.root(tree) for tree in range(0, num_trees, self._determinizations)]
+        return visits, forest.lstm[:, :, root_ids]
+
+    def _select(self, forest, tree, state):
+        """Descends tree by PUCT and returns the leaf, the path to it and its state."""
+        node = forest.root(tree)
+        path = [node]
+        while forest.first_child[node] >= 0 and not state.is_terminal():
+            first = forest.first_child[node]
+            children = slice(first, first + forest.num_children[node])
+            visits = forest.visits[children] + forest.virtual[children]
+            low, high = forest.low[tree], forest.high[tree]
+            if high > low:
+                # A waiting simulation counts as a visit worth the lowest value.
+                values = forest.value[children] + forest.virtual[children] * low
+                mean = np.where(visits > 0, values / np.maximum(visits, 1), low)
+                quality = (mean - low) / (high - low)
+            else:
+                quality = 0.0
+            parent_visits = forest.visits[node] + forest.virtual[node]
+            score = quality + self._c_puct * forest.prior[children] * np.sqrt(max(parent_visits, 1)) / (1 + visits)
+            child = first + int(np.argmax(score))
+            state.apply_move(state.get_move(int(forest.move[child])))
+            forest.reward[child] = state._reward
+            node = child
+            path.append(node)
+        return node, path, state
+
+    def _backup(self, forest, tree, path, value):
+        """Adds the discounted return of a simulation to the nodes of its path."""
+        forest.virtual[path] -= 1
+        forest.visits[path[0]] += 1
+        for node in reversed(path[1:]):
+            value = forest.reward[node] + self._gamma * value
+            forest.value[node] += value
+            forest.visits[node] += 1
+            mean = forest.value[node] / forest.visits[node]
+            forest.low[tree] = min(forest.low[tree], mean)
+            forest.high[tree] = max(forest.high[tree], mean)
+
+    def _flush(self, forest, pending, root_lstm_states, episode_starts):
+        """Evaluates the waiting leaves in one forward pass, expands them and backs up their values."""
+        if not pending:
+            return
+        nodes = list(pending)
+        trees = np.array([pending[node][0] for node in nodes])
+        states = [pending[node][1] for node in nodes]
+        games = trees // self._determinizations
+        num_players = self._game.num_players()
+        turns = np.zeros((len(nodes), num_players), dtype=np.float32)
+        turns[np.arange(len(nodes)), [state.cur_player() for state in states]] = 1
+        observations = np.concatenate(
+            [RegicideBatchState.from_states(self._game, states).encode(), turns], axis=1)
+        masks = np.stack([state.legal_action_mask() for state in states])
+
+        roots = np.array([node == forest.root(tree) for node, tree in zip(nodes, trees)])
+        # A node's evaluation starts from the LSTM states after its parent's observation.
+        parents = [pending[node][2][-2] if not root else 0 for node, root in zip(nodes, roots)]
+        inputs = forest.lstm[:, :, parents]
+        inputs[:, :, roots] = root_lstm_states[:, :, games[roots]]
+        starts = np.where(roots, episode_starts[games], False).astype(np.float32)
+        priors, values, outputs = self._evaluate(observations, masks, inputs, starts)
+        self.forward_passes += 1
+
+        forest.lstm[:, :, nodes] = outputs
+        for i, node in enumerate(nodes):
+            tree, _, path = pending[node]
+            moves = np.flatnonzero(masks[i])
+            first = forest.allocate(tree, len(moves))
+            if first >= 0:
+                forest.move[first:first + len(moves)] = moves
+                forest.prior[first:first + len(moves)] = priors[i, moves]
+                forest.first_child[node] = first
+                forest.num_children[node] = len(moves)
+            if path is not None:
+                self._backup(forest, tree, path, float(values[i]))
+        pending.clear()
@@ -0,0 +1,94 @@
+"""Banks of pre-shuffled deals for reproducible and cheap resets."""
+import numpy as np
+
+from regicide import RegicideState, pack_aggregates, pack_states
+
+
+class RegicideSeedBank(object):
+    """N pre-generated deals of one game configuration.
+
+    Deal i is the draw pile order before the hands are dealt (draw[i]), the
+    enemy desk order (enemies[i]) and the seed of the in-game random
+    Generator (seeds[i]). The bank also keeps the dealt states, packed as
+    records of game.state_dtype() with their game.aggregate_dtype() hashes
+    and totals, so a reset is an array copy; see unpack_states(). Banks are
+    saved as a single .npz file, so every evaluation can be replayed on the
+    identical set of deals.
+    """
+
+    def __init__(self, draw, enemies, seeds, records, aggregates, colors, num_start_ranks, enemy_levels):
+        self.draw = np.asarray(draw, dtype=np.int8)
+        self.enemies = np.asarray(enemies, dtype=np.int8)
+        self.seeds = np.asarray(seeds, dtype=np.uint64)
+        self.records = records
+        self.aggregates = aggregates
+        self._colors = tuple(int(color) for color in colors)
+        self._num_start_ranks = int(num_start_ranks)
+        self._enemy_levels = int(enemy_levels)
+
+    @classmethod
+    def generate(cls, game, size, seed=None):
+        """Shuffles size deals for game.
+
+        Args:
+            game: the RegicideGame the deals are for.
+            size: an integer, the number of deals.
+            seed: an optional seed of the shuffles.
+        """
+        rng = np.random.default_rng(seed)
+        num_ranks = game.num_ranks()
+        cards = np.array([color * num_ranks + rank
+                          for color in game.colors()
+                          for rank in range(game.num_start_ranks())], dtype=np.int8)
+        draw = cards[rng.random((size, len(cards))).argsort(axis=1)]
+        enemies = []
+        for rank in range(10, 10 + game.enemy_levels()):
+            group = np.array([color * num_ranks + rank for color in game.colors()], dtype=np.int8)
+            enemies.append(group[rng.random((size, len(group))).argsort(axis=1)])
+        enemies = np.concatenate(enemies, axis=1)
+        seeds = rng.integers(0, 1 << 63, size=size, dtype=np.uint64)
+        states = [RegicideState.from_deal(game, draw[i], enemies[i], int(seeds[i])) for i in range(size)]
+        return cls(draw, enemies, seeds, pack_states(states), pack_aggregates(states),
+                   game.colors(), game.num_start_ranks(), game.enemy_levels())
+
+    @classmethod
+    def load(cls, path):
+        """Loads a bank written by save()."""
+        with np.load(path) as data:
+            return cls(data["draw"], data["enemies"], data["seeds"], data["records"], data["aggregates"],
+                       data["colors"], data["num_start_ranks"], data["enemy_levels"])
+
+    def save(self, path):
+        """Writes the bank to a .npz file."""
+        np.savez(path, draw=self.draw, enemies=self.enemies, seeds=self.seeds, records=self.records,
+                 aggregates=self.aggregates, colors=np.array(self._colors), num_start_ranks=self._num_start_ranks,
+                 enemy_levels=self._enemy_levels)
+
+    def check(self, game):
+        """Raises ValueError if the deals are not deals of game."""
+        if (self._colors != tuple(game.colors()) or self._num_start_ranks != game.num_start_ranks() or
+                self._enemy_levels != game.enemy_levels()):
+            raise ValueError("The seed bank was generated for another game configuration.")
+        if self.records.dtype != game.state_dtype() or self.aggregates.dtype != game.aggregate_dtype():
+            raise ValueError("The seed bank was dealt for another number of players or enemies.")
+        if int(self.aggregates['hand_size'].max(initial=0)) != game.hand_size():
+            raise ValueError("The seed bank was dealt for another hand size.")
+
+    def shard(self, worker, num_workers):
+        """Returns the deals worker, worker + num_workers, ... as a new bank.
+
+        The shards of num_workers workers split the bank without overlap.
+        """
+        if not 0 <= worker < num_workers:
+            raise ValueError("worker must be in [0, %d)." % num_workers)
+        return RegicideSeedBank(self.draw[worker::num_workers], self.enemies[worker::num_workers],
+                                self.seeds[worker::num_workers], self.records[worker::num_workers],
+                                self.aggregates[worker::num_workers], self._colors, self._num_start_ranks,
+                                self._enemy_levels)
+
+    def new_state(self, game, index):
+        """Returns the RegicideState of deal index, copied from its packed record."""
+        return RegicideState._unpack(game, self.records[index], self.aggregates[index])
+
+    def __len__(self):
+        return len(self.seeds)
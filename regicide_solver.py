@@ -0,0 +1,291 @@
+"""Exact search of Regicide positions whose draw pile order is known.
+
+The solver answers whether a position can be won and in how few moves when
+every hand and the order of the draw pile are known. The only randomness
+left is the heart effect, which picks discarded cards at random; the solver
+fixes each pick as a function of the position and the move, see
+RegicideSolver.apply(), so the game it searches is deterministic and equal
+positions always have equal values.
+
+The search is a depth-first branch and bound over moves with a bounded
+transposition table. It prunes with:
+    - a lower bound: every move defeats at most one enemy, so a position
+      needs at least as many moves as there are enemies left;
+    - dominance of discard orders: within one DISCARD phase only the last
+      discard affects whether the phase ends, so the discards before it are
+      only searched in decreasing card key order;
+    - sibling transpositions: moves leading to the same position, such as
+      an ace paired with either of two equivalent cards, are searched once.
+"""
+import collections
+
+import numpy as np
+
+from regicide import RegicideStateType
+from regicide_hash import splitmix64
+from regicide_move import RegicideMoveType, greedy_scores
+
+SOLVER_KEYS = ("hash", "exact")
+
+# Distance to a win of the positions that cannot be won.
+LOST = 1 << 30
+
+SolverResult = collections.namedtuple(
+    "SolverResult", ["win", "moves", "pv", "nodes", "tt_hits", "evictions"])
+
+
+class _SearchAborted(Exception):
+    """Raised when a search runs out of its node budget."""
+
+
+class RegicideSolver(object):
+    """Depth-first solver with a least-recently-used transposition table.
+
+    The table maps a position to bounds on its distance to a win, in moves,
+    and the best move found. It holds at most max_entries positions; the
+    least recently used one is evicted to make room. Entries stay valid
+    between calls to solve(), so solving several positions of one game with
+    the same solver reuses the work.
+    """
+
+    def __init__(self, game, max_entries=1 << 20, key="hash"):
+        """Creates a solver for the states of game.
+
+        Args:
+            game: the RegicideGame of the positions to solve.
+            max_entries: the maximum number of positions in the table.
+            key: "hash" to key positions by RegicideState.state_hash(), or
+              "exact" to key them by canonical_key(), which cannot collide
+              but takes more memory.
+        """
+        if key not in SOLVER_KEYS:
+            raise ValueError("Unknown solver key %r, expected one of %s." % (key, SOLVER_KEYS))
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive.")
+        self._game = game
+        self._max_entries = max_entries
+        self._key = key
+        self._table = collections.OrderedDict()
+
+        self._move_values, self._move_clubs = game.move_values()
+        self._move_cards = game.move_table().card_ids
+        self._move_types = game.move_table().types
+
+        self._minimize = True
+        self._max_nodes = None
+        self.nodes = 0
+        self.tt_hits = 0
+        self.evictions = 0
+
+    def solve(self, state, max_moves=None, max_nodes=None, minimize=True):
+        """Searches the position of state.
+
+        Args:
+            state: the RegicideState to solve; it is not modified.
+            max_moves: None, or only wins in at most max_moves moves count.
+            max_nodes: None, or the number of positions to search before
+              giving up.
+            minimize: if True the fewest moves to a win are searched for,
+              otherwise the search stops at the first win found.
+
+        Returns:
+            A SolverResult. win is True or False, or None if the search ran
+            out of nodes; with max_moves False only means there is no win
+            within max_moves. moves is the length of the win found, pv its
+            move ids from state, and nodes, tt_hits and evictions count the
+            positions searched, the table hits and the entries evicted.
+        """
+        self._minimize = minimize
+        self._max_nodes = max_nodes
+        self.nodes = 0
+        self.tt_hits = 0
+        self.evictions = 0
+        if state.is_chance_node():
+            raise ValueError("The solver cannot start from a chance node.")
+        limit = LOST - 1 if max_moves is None else max_moves
+        state = state.clone()
+        try:
+            value = self._search(state, limit, None)
+        except _SearchAborted:
+            return SolverResult(None, None, [], self.nodes, self.tt_hits, self.evictions)
+        if value > limit:
+            return SolverResult(False, None, [], self.nodes, self.tt_hits, self.evictions)
+        pv = self._principal_variation(state)
+        return SolverResult(True, len(pv), pv, self.nodes, self.tt_hits, self.evictions)
+
+    def apply(self, state, move_id, undo=False):
+        """Plays a move the way the solver does.
+
+        A heart effect picks the cards of a shuffle of the discard pile that
+        is seeded by the state_hash() of the position and the move, instead
+        of using the state's random Generator. Replaying a principal
+        variation with this function reaches the win it promises.
+
+        Args:
+            state: the RegicideState to play on.
+            move_id: the id of a legal move.
+            undo: bool, whether to return the undo records.
+
+        Returns:
+            The list of records to undo in reverse order with
+            RegicideState.undo_move(), or of None values if undo is False.
+        """
+        position = state.state_hash()
+        records = [state.apply_move(state.get_move(move_id), undo=undo, stop_at_chance=True)]
+        if state.is_chance_node():
+            outcome = self._heart_outcome(position, move_id, state.chance_node())
+            records.append(state.apply_chance(outcome, undo=undo))
+        return records
+
+    def clear(self):
+        """Empties the transposition table."""
+        self._table.clear()
+
+    def __len__(self):
+        return len(self._table)
+
+    def _heart_outcome(self, position, move_id, chance):
+        """Returns the cards a heart effect picks at a position."""
+        card_ids = sorted(chance.card_ids())
+        seed = splitmix64(position ^ (move_id << 52))
+        for i in range(chance.count()):
+            seed = splitmix64(seed)
+            j = i + seed % (len(card_ids) - i)
+            card_ids[i], card_ids[j] = card_ids[j], card_ids[i]
+        return tuple(card_ids[:chance.count()])
+
+    def _position_key(self, state, last):
+        """Returns the table key of a position.
+
+        last is the card key of the previous discard of the current DISCARD
+        phase, or None: it restricts the moves searched, so it is part of
+        the position.
+        """
+        if self._key == "hash":
+            return state.state_hash(), last
+        return state.canonical_key(), last
+
+    def _lower_bound(self, state):
+        """Returns a lower bound on the moves needed to win from state."""
+        return state.enemy_desk_size() + (state.cur_state() == RegicideStateType.DISCARD)
+
+    def _ordered_moves(self, state, last):
+        """Returns the move ids to search at a position, most promising first.
+
+        The order is the greedy one of regicide_move.greedy_scores(): the
+        defeating moves from the least overkill, so that moves defeating the
+        enemy with exactly its health, which put it on top of the draw pile,
+        come first, then the rest from the most damage. In DISCARD, discards
+        that end the phase come first from the least overkill, then the rest
+        from the most valuable card.
+        """
+        moves = np.asarray(state.legal_moves_as_int(), dtype=np.intp)
+        discarding = state.cur_state() == RegicideStateType.DISCARD
+        if discarding and last is not None:
+            keep = (self._move_values[moves] >= state.demage()) | (self._move_cards[moves] < last)
+            moves = moves[keep]
+        score = greedy_scores(self._move_values[moves], self._move_clubs[moves], discarding, state.demage(),
+                              state.current_enemy_color(), state.current_enemy_health())
+        return moves[np.argsort(-score, kind="stable")].tolist()
+
+    def _store(self, key, lower, upper, move_id):
+        entry = self._table.get(key)
+        if entry is not None:
+            entry[0] = max(entry[0], lower)
+            if move_id >= 0 and upper <= entry[1]:
+                entry[2] = move_id
+            entry[1] = min(entry[1], upper)
+            self._table.move_to_end(key)
+            return
+        self._table[key] = [lower, upper, move_id]
+        if len(self._table) > self._max_entries:
+            self._table.popitem(last=False)
+            self.evictions += 1
+
+    def _search(self, state, limit, last):
+        """Returns the distance of state to a win if it is at most limit.
+
+        Otherwise returns a lower bound on the distance that is greater
+        than limit, LOST if the position cannot be won. Without minimize,
+        a win is returned as soon as one is found, and may not be the
+        shortest one.
+        """
+        if state.is_terminal():
+            return 0 if state.is_win() else LOST
+        self.nodes += 1
+        if self._max_nodes is not None and self.nodes > self._max_nodes:
+            raise _SearchAborted
+        key = self._position_key(state, last)
+        entry = self._table.get(key)
+        if entry is not None:
+            self.tt_hits += 1
+            self._table.move_to_end(key)
+            lower, upper, _ = entry
+            if lower == upper or lower > limit:
+                return lower
+            if not self._minimize and upper < LOST:
+                return upper
+        else:
+            lower = self._lower_bound(state)
+            if lower > limit:
+                self._store(key, lower, LOST, -1)
+                return lower
+
+        best, best_move = LOST, -1
+        fail = LOST
+        seen = set()
+        for move_id in self._ordered_moves(state, last):
+            child_limit = min(limit, best - 1) - 1
+            if child_limit < 0:
+                break
+            records = self.apply(state, move_id, undo=True)
+            child_last = None
+            if (self._move_types[move_id] == RegicideMoveType.DISCARD and
+                    state.cur_state() == RegicideStateType.DISCARD):
+                child_last = int(self._move_cards[move_id])
+            child_key = self._position_key(state, child_last)
+            if child_key in seen:
+                value = None
+            else:
+                seen.add(child_key)
+                value = self._search(state, child_limit, child_last)
+            for record in reversed(records):
+                state.undo_move(record)
+            if value is None or value >= LOST:
+                continue
+            if value <= child_limit:
+                best, best_move = value + 1, move_id
+                if not self._minimize:
+                    break
+            else:
+                fail = min(fail, value + 1)
+
+        if best < LOST:
+            self._store(key, best if self._minimize else lower, best, best_move)
+            return best
+        if fail >= LOST:
+            self._store(key, LOST, LOST, -1)
+            return LOST
+        self._store(key, fail, LOST, -1)
+        return fail
+
+    def _principal_variation(self, state):
+        """Returns the move ids of the win stored in the table for state."""
+        pv = []
+        last = None
+        while not state.is_terminal():
+            key = self._position_key(state, last)
+            entry = self._table.get(key)
+            if entry is None or entry[1] >= LOST or entry[2] < 0:
+                # The entry was evicted: search the position again.
+                self._max_nodes = None
+                self._search(state, LOST - 1, last)
+                entry = self._table[key]
+            move_id = entry[2]
+            pv.append(move_id)
+            self.apply(state, move_id)
+            last = None
+            if (self._move_types[move_id] == RegicideMoveType.DISCARD and
+                    state.cur_state() == RegicideStateType.DISCARD):
+                last = int(self._move_cards[move_id])
+        return pv
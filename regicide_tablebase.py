@@ -0,0 +1,368 @@
+"""Endgame tablebase for the last enemies of a game.
+
+The tablebase holds the exact value of every endgame position with at most
+max_enemies enemies left and at most max_hand cards in the current player's
+hand, in the endgame in which the hand is never refilled: the draw pile and
+the heart and diamond powers are left out. A position of the game itself
+only has that value when no card can come back into the hand, so lookup()
+only answers single-player positions with an empty draw pile and no diamond
+in hand.
+
+Without refills a card only matters by its value and by whether it is a
+spade, a club or neither, and an enemy by its health, its attack and the
+same three classes, so positions are indexed by the multiset of card types
+in hand, the classes of the enemies left, and the current enemy's health
+and attack. The index is a perfect hash into one flat int8 array that is
+saved as a .npy file with a .json description and memory-mapped on load.
+Only PLAY positions are stored; a DISCARD position is looked up as the best
+of the PLAY positions its discards lead to.
+"""
+import itertools
+import json
+
+import numpy as np
+
+from regicide import RegicideStateType
+
+TABLEBASE_FORMAT = 1
+
+# Card and enemy classes: the powers that still matter without refills.
+PLAIN, SPADES, CLUBS = 0, 1, 2
+NUM_CLASSES = 3
+
+# Stored value of the positions that are lost.
+LOSS = -1
+
+# Value of lost positions while the tables are built.
+_LOST = 127
+
+
+def card_class(color):
+    """Returns the class of a card or enemy of the given color."""
+    return SPADES if color == 2 else CLUBS if color == 3 else PLAIN
+
+
+class RegicideTablebase(object):
+    """Plays to win of the endgame positions of one game configuration.
+
+    Values are the number of plays, not counting discards, to defeat every
+    enemy left, or LOSS.
+    """
+
+    def __init__(self, meta, values):
+        """Wraps built or loaded tables; use build() or load() instead."""
+        self._meta = meta
+        self._values = values
+        self._max_enemies = meta["max_enemies"]
+        self._max_hand = meta["max_hand"]
+        self._types = [tuple(t) for t in meta["types"]]
+        self._caps = [cap for _, _, cap in self._types]
+        self._type_values = [value for value, _, _ in self._types]
+        self._shapes = [tuple(shape) for shape in meta["shapes"]]
+        self._offsets = meta["offsets"]
+        self._ways = _hand_ways(self._caps, self._max_hand)
+        self._size_offsets = np.concatenate([[0], np.cumsum(self._ways[0])]).tolist()
+        self._type_index = {t[:2]: i for i, t in enumerate(self._types)}
+        self._card_types = {}
+
+    @classmethod
+    def build(cls, game, max_enemies=2, max_hand=3):
+        """Solves every endgame position of game, from the last enemy back.
+
+        Positions with fewer cards are solved first: every play removes at
+        least one card from the hand, so the positions a play leads to are
+        always solved already.
+
+        Args:
+            game: the RegicideGame whose endgames to solve.
+            max_enemies: the largest number of enemies left to cover.
+            max_hand: the largest hand to cover.
+        """
+        if game.num_players() != 1:
+            raise ValueError("Tablebases cover single-player games only.")
+        if not 1 <= max_enemies <= game.num_enemies():
+            raise ValueError("max_enemies must be in [1, %d]." % game.num_enemies())
+        types = _card_types(game)
+        levels = _last_levels(game, max_enemies)
+        num_hands = _num_hands([cap for _, _, cap in types], max_hand)
+        shapes, offsets, size = [], [], 0
+        for k in range(1, max_enemies + 1):
+            level = levels[k - 1]
+            shapes.append([num_hands, NUM_CLASSES ** (k - 1), NUM_CLASSES,
+                           game.enemy_health()[level] + 1, game.enemy_attack()[level] + 1])
+            offsets.append(size)
+            size += int(np.prod(shapes[-1]))
+        meta = {
+            "format": TABLEBASE_FORMAT,
+            "colors": list(game.colors()),
+            "num_start_ranks": game.num_start_ranks(),
+            "enemy_levels": game.enemy_levels(),
+            "enemy_health": list(game.enemy_health()),
+            "enemy_attack": list(game.enemy_attack()),
+            "maximum_combo": game.maximum_combo(),
+            "max_enemies": max_enemies,
+            "max_hand": max_hand,
+            "levels": levels,
+            "types": [list(t) for t in types],
+            "shapes": shapes,
+            "offsets": offsets,
+        }
+        tablebase = cls(meta, None)
+        hands = tablebase._hands()
+        moves = [tablebase._hand_moves(game, hand) for hand in hands]
+        totals = np.array([sum(c * v for c, v in zip(hand, tablebase._type_values)) for hand in hands])
+        values = np.empty(size, dtype=np.int8)
+        tables = []
+        for k in range(1, max_enemies + 1):
+            table = tablebase._solve_level(game, k, hands, moves, totals, tables)
+            tables.append(table)
+            flat = table.reshape(-1)
+            values[offsets[k - 1]:offsets[k - 1] + flat.size] = np.where(flat == _LOST, LOSS, flat)
+        tablebase._values = values
+        return tablebase
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Loads a tablebase written by save(), memory-mapped by default."""
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        if meta["format"] != TABLEBASE_FORMAT:
+            raise ValueError("Unsupported tablebase format %r." % meta["format"])
+        return cls(meta, np.load(path + ".npy", mmap_mode="r" if mmap else None))
+
+    def save(self, path):
+        """Writes the values to path.npy and their description to path.json."""
+        np.save(path + ".npy", np.asarray(self._values))
+        with open(path + ".json", "w") as f:
+            json.dump(self._meta, f)
+
+    def check(self, game):
+        """Raises ValueError if the tablebase was built for another game configuration."""
+        config = (list(game.colors()), game.num_start_ranks(), game.enemy_levels(),
+                  list(game.enemy_health()), list(game.enemy_attack()), game.maximum_combo())
+        meta = self._meta
+        if config != (meta["colors"], meta["num_start_ranks"], meta["enemy_levels"],
+                      meta["enemy_health"], meta["enemy_attack"], meta["maximum_combo"]):
+            raise ValueError("The tablebase was built for another game configuration.")
+
+    def max_enemies(self):
+        return self._max_enemies
+
+    def max_hand(self):
+        return self._max_hand
+
+    def lookup(self, state):
+        """Returns the plays to win from state, LOSS, or None if not covered.
+
+        Positions are covered when they are not terminal nor at a chance
+        node, have at most max_enemies() enemies left and at most max_hand()
+        cards in the current player's hand, and match the endgame the
+        tablebase solves: a single player, an empty draw pile and no diamond
+        in hand, so the hand can never be refilled.
+        """
+        if state.is_terminal() or state.is_chance_node():
+            return None
+        game = state._game
+        if game.num_players() != 1 or state.deck_size() > 0:
+            return None
+        enemy_ids = state._enemy_desk.ids().tolist()
+        hand = state.cur_player_hand()
+        if len(enemy_ids) > self._max_enemies or len(hand) > self._max_hand:
+            return None
+        if hand.card_set().color_count(1) > 0:
+            return None
+        counts = [0] * len(self._types)
+        for card_id in hand.card_set():
+            counts[self._card_type(game, card_id)] += 1
+        k = len(enemy_ids)
+        classes = [card_class(game.card(enemy_id).color()) for enemy_id in enemy_ids]
+        code = sum(c * NUM_CLASSES ** i for i, c in enumerate(classes[1:]))
+        health = state.current_enemy_health()
+        attack = state.current_enemy_attack()
+        if state.cur_state() == RegicideStateType.PLAY:
+            return self._value(k, counts, code, classes[0], health, attack)
+        best = _LOST
+        for discard in self._discards(counts, state.demage()):
+            value = self._value(k, [c - d for c, d in zip(counts, discard)], code, classes[0], health, attack)
+            if value != LOSS:
+                best = min(best, value)
+        return LOSS if best == _LOST else best
+
+    def index(self, k, counts, code, enemy_class, health, attack):
+        """Returns the position of a PLAY endgame in the flat value array.
+
+        Args:
+            k: the number of enemies left.
+            counts: the number of cards in hand of each card type.
+            code: the classes of the enemies after the current one, the
+              next one in the lowest base NUM_CLASSES digit.
+            enemy_class: the class of the current enemy.
+            health, attack: the current enemy's health and attack.
+        """
+        _, num_codes, _, num_healths, num_attacks = self._shapes[k - 1]
+        index = self._rank(counts)
+        index = (index * num_codes + code) * NUM_CLASSES + enemy_class
+        index = (index * num_healths + health) * num_attacks + attack
+        return self._offsets[k - 1] + index
+
+    def _value(self, k, counts, code, enemy_class, health, attack):
+        return int(self._values[self.index(k, counts, code, enemy_class, health, attack)])
+
+    def _card_type(self, game, card_id):
+        if card_id not in self._card_types:
+            card = game.card(card_id)
+            self._card_types[card_id] = self._type_index[card.value(), card_class(card.color())]
+        return self._card_types[card_id]
+
+    def _rank(self, counts):
+        """Returns the perfect hash of a hand: its rank among the hands of its size."""
+        n = sum(counts)
+        rank = self._size_offsets[n]
+        for t, count in enumerate(counts):
+            for x in range(count):
+                rank += self._ways[t + 1][n - x]
+            n -= count
+        return rank
+
+    def _hands(self):
+        """Returns every hand as a tuple of counts, in rank order."""
+        def fill(t, n):
+            if t == len(self._caps):
+                if n == 0:
+                    yield ()
+                return
+            for x in range(min(self._caps[t], n) + 1):
+                for rest in fill(t + 1, n - x):
+                    yield (x,) + rest
+        return [hand for n in range(self._max_hand + 1) for hand in fill(0, n)]
+
+    def _discards(self, counts, demage):
+        """Yields the discards that end a DISCARD phase of the given damage.
+
+        The cards are discarded one at a time until the damage is covered,
+        so every card but the most valuable is needed to cover it. A hand
+        worth no more than the damage loses, and has no discards.
+        """
+        total = sum(c * v for c, v in zip(counts, self._type_values))
+        if total <= demage:
+            return
+        for discard in itertools.product(*[range(c + 1) for c in counts]):
+            value = sum(d * v for d, v in zip(discard, self._type_values))
+            if value >= demage and value - max(v for d, v in zip(discard, self._type_values) if d) < demage:
+                yield discard
+
+    def _hand_moves(self, game, hand):
+        """Returns the distinct plays of a hand as (hand after, value, spades, clubs)."""
+        physical = {}
+        for card_id in _deck(game):
+            card = game.card(card_id)
+            physical.setdefault((card.value(), card_class(card.color())), []).append(card_id)
+        held = np.zeros(game.num_cards() + 1, dtype=bool)
+        held[game.num_cards()] = True
+        for t, count in enumerate(hand):
+            held[physical[self._types[t][:2]][:count]] = True
+        move_cards, move_phases = game.legal_move_table()
+        legal = held[move_cards].all(axis=1) & move_phases[RegicideStateType.PLAY]
+        moves = set()
+        for move_id in np.flatnonzero(legal):
+            after = list(hand)
+            value, spades, clubs = 0, False, False
+            for card_id in move_cards[move_id].tolist():
+                if card_id == game.num_cards():
+                    continue
+                card = game.card(card_id)
+                after[self._card_type(game, card_id)] -= 1
+                value += card.value()
+                spades |= card_class(card.color()) == SPADES
+                clubs |= card_class(card.color()) == CLUBS
+            moves.add((tuple(after), value, spades, clubs))
+        return sorted(moves)
+
+    def _solve_level(self, game, k, hands, moves, totals, tables):
+        """Returns the plays to win of every position with k enemies left."""
+        num_hands, num_codes, _, num_healths, num_attacks = self._shapes[k - 1]
+        ranks = {hand: rank for rank, hand in enumerate(hands)}
+        table = np.full((num_hands, num_codes, NUM_CLASSES, num_healths, num_attacks), _LOST, dtype=np.int16)
+        # Value of entering the DISCARD phase with the damage of the enemy's attack.
+        discard_table = np.full_like(table, _LOST)
+        healths = np.arange(num_healths)[:, None]
+        attacks = np.arange(num_attacks)[None, :]
+        if k > 1:
+            level = self._meta["levels"][k - 2]
+            codes = np.arange(num_codes)
+            # Plays to win once the current enemy is defeated, by code.
+            next_values = lambda rank: tables[k - 2][rank, codes // NUM_CLASSES, codes % NUM_CLASSES,
+                                                      game.enemy_health()[level], game.enemy_attack()[level]]
+        for rank, hand in enumerate(hands):
+            best = table[rank]
+            for after, value, spades, clubs in moves[rank]:
+                after_rank = ranks[after]
+                for enemy_class in range(NUM_CLASSES):
+                    attack = value * 2 if clubs and enemy_class != CLUBS else value
+                    new_attacks = np.maximum(attacks - value, 0) if spades and enemy_class != SPADES else attacks
+                    new_attacks = np.broadcast_to(new_attacks, (num_healths, num_attacks))
+                    new_healths = np.broadcast_to(healths - attack, (num_healths, num_attacks))
+                    alive = new_healths > 0
+                    result = np.full((num_codes, num_healths, num_attacks), _LOST, dtype=np.int16)
+                    if sum(after):
+                        h = np.where(alive, new_healths, 0)
+                        play = table[after_rank][:, enemy_class][:, h, new_attacks]
+                        discard = discard_table[after_rank][:, enemy_class][:, h, new_attacks]
+                        result = np.where(alive & (new_attacks == 0), play, result)
+                        result = np.where(alive & (new_attacks > 0), discard, result)
+                        if k > 1:
+                            result = np.where(alive, result, next_values(after_rank)[:, None, None])
+                    if k == 1:
+                        result = np.where(alive, result, 0)
+                    result = np.where(result == _LOST, _LOST, result + 1)
+                    np.minimum(best[:, enemy_class], result, out=best[:, enemy_class])
+            # Health 0 is not a position; keep it lost.
+            best[:, :, 0] = _LOST
+            for discard in itertools.product(*[range(c + 1) for c in hand]):
+                if not any(discard):
+                    continue
+                value = sum(d * v for d, v in zip(discard, self._type_values))
+                top = max(v for d, v in zip(discard, self._type_values) if d)
+                damage = (attacks >= 1) & (attacks <= value) & (attacks > value - top) & (attacks < totals[rank])
+                after_rank = ranks[tuple(c - d for c, d in zip(hand, discard))]
+                candidate = np.where(damage, table[after_rank], _LOST)
+                np.minimum(discard_table[rank], candidate, out=discard_table[rank])
+        return table
+
+
+def _hand_ways(caps, max_hand):
+    """Returns ways[t][n], the number of hands of n cards of the types t and up."""
+    ways = [[0] * (max_hand + 1) for _ in range(len(caps) + 1)]
+    ways[-1][0] = 1
+    for t in range(len(caps) - 1, -1, -1):
+        for n in range(max_hand + 1):
+            ways[t][n] = sum(ways[t + 1][n - x] for x in range(min(caps[t], n) + 1))
+    return ways
+
+
+def _num_hands(caps, max_hand):
+    """Returns the number of hands of at most max_hand cards."""
+    return sum(_hand_ways(caps, max_hand)[0])
+
+
+def _deck(game):
+    """Returns the card keys that can be in a hand of game."""
+    num_ranks = game.num_ranks()
+    ranks = list(range(game.num_start_ranks())) + list(range(10, 10 + game.enemy_levels()))
+    return [color * num_ranks + rank for color in game.colors() for rank in ranks]
+
+
+def _card_types(game):
+    """Returns the (value, class, count) card types of game, in rank order."""
+    counts = {}
+    for card_id in _deck(game):
+        card = game.card(card_id)
+        key = (card.value(), card_class(card.color()))
+        counts[key] = counts.get(key, 0) + 1
+    return [key + (count,) for key, count in sorted(counts.items())]
+
+
+def _last_levels(game, count):
+    """Returns the levels of the last count enemies of the desk, the last one first."""
+    num_colors = len(game.colors())
+    return [game.enemy_levels() - 1 - i // num_colors for i in range(count)]
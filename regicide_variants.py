@@ -0,0 +1,67 @@
+"""Named RegicideGame configurations.
+
+Every variant keeps the card ids, the move ids and the observation layout of
+the full game, so a policy trained on a reduced variant can be fine-tuned on
+a larger one. The reduced variants pin max_enemy_health and max_enemy_attack
+to the values of the full game for that reason.
+"""
+import copy
+
+# Encoding sizes of the full game, shared by the reduced variants.
+FULL_LAYOUT = {
+    "max_enemy_health": 40,
+    "max_enemy_attack": 20,
+}
+
+REGICIDE_VARIANTS = {}
+
+
+def register_variant(name, config, base=None):
+    """Registers a named game configuration.
+
+    Args:
+        name: the name of the variant, as passed to RegicideEnv.
+        config: a dict of RegicideGame parameters, without the seed.
+        base: an optional registered variant whose parameters config updates.
+    """
+    if name in REGICIDE_VARIANTS:
+        raise ValueError("Variant {} is already registered".format(name))
+    params = dict(REGICIDE_VARIANTS[base]) if base is not None else {}
+    params.update(config)
+    REGICIDE_VARIANTS[name] = params
+
+
+def variant_config(name, seed):
+    """Returns the RegicideGame parameters of a registered variant."""
+    if name not in REGICIDE_VARIANTS:
+        raise ValueError("Unknown environment {}".format(name))
+    config = copy.deepcopy(REGICIDE_VARIANTS[name])
+    config["seed"] = seed
+    return config
+
+
+register_variant("Regicide-Single", {
+    "players": 1,
+    "hand_size": 8,
+    "enemy_health": [20,30,40],
+    "enemy_attack": [10,15,20],
+    "yield_enable": True,
+    "maximum_combo": 10,
+})
+register_variant("Regicide-Double", {
+    "players": 2,
+    "hand_size": 7,
+    "enemy_health": [20,30,40],
+    "enemy_attack": [10,15,20],
+    "yield_enable": True,
+    "maximum_combo": 10,
+})
+
+# Reduced variants for curriculum training, from the easiest up.
+register_variant("Regicide-Single-Jacks", dict(FULL_LAYOUT, enemy_levels=1), base="Regicide-Single")
+register_variant("Regicide-Single-Court", dict(FULL_LAYOUT, enemy_levels=2), base="Regicide-Single")
+register_variant("Regicide-Single-Weak", dict(FULL_LAYOUT, enemy_health=[10,20,30], enemy_attack=[5,10,15]),
+                 base="Regicide-Single")
+register_variant("Regicide-Single-TwoSuits", dict(FULL_LAYOUT, colors=(0, 2)), base="Regicide-Single")
+register_variant("Regicide-Double-Jacks", dict(FULL_LAYOUT, enemy_levels=1), base="Regicide-Double")
+register_variant("Regicide-Double-Court", dict(FULL_LAYOUT, enemy_levels=2), base="Regicide-Double")
@@ -0,0 +1,43 @@
+import itertools
+import random
+
+import numpy as np
+
+from regicide import RegicideGame
+from regicide_batch import RegicideBatchState
+from regicide_env import ObservationEncoder
+from regicide_variants import REGICIDE_VARIANTS, variant_config
+
+
+def _assert_batch_matches(batch, states, encoder):
+    assert (batch.legal_masks() == [state.legal_action_mask() for state in states]).all()
+    assert (batch.encode() == [np.array(encoder.encode(state), dtype=np.float32) for state in states]).all()
+    assert batch.cur_state().tolist() == [int(state.cur_state()) for state in states]
+    assert batch.is_terminal().tolist() == [state.is_terminal() for state in states]
+
+
+def test_batch_plays_like_the_states():
+    for name, seed in itertools.product(REGICIDE_VARIANTS, range(3)):
+        game = RegicideGame(variant_config(name, seed))
+        encoder = ObservationEncoder(game)
+        hearts = [key // game.num_ranks() == 0 for key in range(game.num_cards())] + [False]
+        move_cards = game.legal_move_table()[0]
+        states = [game.new_initial_state() for _ in range(8)]
+        batch = RegicideBatchState.from_states(game, states, seed=seed)
+        rng = random.Random(seed)
+        while not batch.is_terminal().all():
+            _assert_batch_matches(batch, states, encoder)
+            active = [not state.is_terminal() for state in states]
+            actions = [rng.choice(state.legal_moves_as_int()) if playing else 0
+                       for state, playing in zip(states, active)]
+            rewards = batch.apply_moves(np.array(actions)).copy()
+            for state, action, playing in zip(states, actions, active):
+                if playing:
+                    state.apply_move(state.get_move(action))
+            assert [reward for reward, playing in zip(rewards, active) if playing] == \
+                [state._reward for state, playing in zip(states, active) if playing]
+            # Heart effects pick their cards at random, so both sides restart from the states.
+            if any(playing and any(hearts[card] for card in move_cards[action])
+                   for action, playing in zip(actions, active)):
+                batch = RegicideBatchState.from_states(game, states, seed=seed)
+        _assert_batch_matches(batch, states, encoder)
@@ -0,0 +1,44 @@
+import itertools
+import random
+
+from regicide import CHANCE_PLAYER_ID, RegicideGame
+from regicide_variants import REGICIDE_VARIANTS, variant_config
+
+
+def _snapshot(state):
+    # States at a chance node cannot be serialized.
+    data = None if state.is_chance_node() else state.to_bytes()
+    return state.state_hash(), data, state.legal_action_mask().tolist()
+
+
+def test_chance_nodes_match_moves_that_do_not_stop():
+    chance_nodes = 0
+    for name, seed in itertools.product(REGICIDE_VARIANTS, range(3)):
+        game = RegicideGame(variant_config(name, seed))
+        state = game.new_initial_state()
+        stopping = state.clone()
+        rng = random.Random(seed)
+        snapshots = []
+        records = []
+        while not state.is_terminal():
+            move = rng.choice(state.legal_moves())
+            state.apply_move(move)
+            snapshots.append(_snapshot(stopping))
+            records.append(stopping.apply_move(move, undo=True, stop_at_chance=True))
+            if stopping.is_chance_node():
+                chance_nodes += 1
+                node = stopping.chance_node()
+                assert stopping.cur_player() == CHANCE_PLAYER_ID
+                assert not stopping.legal_action_mask().any()
+                # An outcome drawn from the same Generator is the one apply_chance(None) picks.
+                drawn = stopping.clone()
+                drawn.apply_chance(node.sample(drawn._rng))
+                snapshots.append(_snapshot(stopping))
+                records.append(stopping.apply_chance(undo=True))
+                assert _snapshot(drawn) == _snapshot(stopping)
+            assert _snapshot(stopping) == _snapshot(state)
+            assert stopping._reward == state._reward
+        while records:
+            stopping.undo_move(records.pop())
+            assert _snapshot(stopping) == snapshots.pop()
+    assert chance_nodes > 0
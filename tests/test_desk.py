@@ -0,0 +1,19 @@
+from regicide import RegicideGame
+from regicide_desk import END_ENEMY
+from regicide_variants import variant_config
+
+
+def test_enemy_snapshots_are_replaced_only_on_changes():
+    game = RegicideGame(variant_config("Regicide-Single", 0))
+    desk = game.new_initial_state()._enemy_desk
+    enemy = desk.current_enemy()
+    assert desk.current_enemy() is enemy
+    copy = desk.clone()
+    desk.set_health(enemy.key(), enemy.health() - 5)
+    damaged = desk.current_enemy()
+    assert damaged is not enemy and damaged.health() == enemy.health() - 5
+    desk.set_attack(enemy.key(), 0)
+    assert desk.current_enemy().attack() == 0 and damaged.attack() == enemy.attack()
+    assert copy.current_enemy() is enemy
+    desk.set_enemies([], [], [])
+    assert desk.current_enemy() is END_ENEMY
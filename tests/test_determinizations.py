@@ -0,0 +1,28 @@
+import random
+
+from regicide import RegicideGame, unpack_states
+from regicide_variants import variant_config
+
+
+def _state_with_known_bottom(min_cards):
+    for seed in range(100):
+        game = RegicideGame(variant_config("Regicide-Single", seed))
+        state = game.new_initial_state()
+        rng = random.Random(seed)
+        while not state.is_terminal():
+            if state._desk.known()[1] >= min_cards:
+                return game, state
+            state.apply_move(rng.choice(state.legal_moves()))
+    raise AssertionError("No heart effect put %d cards under the draw pile." % min_cards)
+
+
+def test_known_bottom_order_is_shuffled():
+    game, state = _state_with_known_bottom(3)
+    known_bottom = state._desk.known()[1]
+    bottom = state._desk.ids()[-known_bottom:].tolist()
+    orders = set()
+    for sample in unpack_states(game, state.sample_determinizations(50, seed=0)):
+        sample_bottom = sample._desk.ids()[-known_bottom:].tolist()
+        assert sorted(sample_bottom) == sorted(bottom)
+        orders.add(tuple(sample_bottom))
+    assert len(orders) > 1
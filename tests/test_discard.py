@@ -0,0 +1,87 @@
+import itertools
+import random
+import types
+
+from regicide import RegicideGame, RegicideStateType
+from regicide_batch import RegicideBatchState
+from regicide_discard import DISCARD_RESOLVERS
+from regicide_env import RegicideEnv
+from regicide_variants import REGICIDE_VARIANTS, variant_config
+
+
+def _discard_states():
+    for name, seed in itertools.product(REGICIDE_VARIANTS, range(3)):
+        game = RegicideGame(variant_config(name, seed))
+        state = game.new_initial_state()
+        rng = random.Random(seed)
+        while not state.is_terminal():
+            if state.cur_state() == RegicideStateType.DISCARD:
+                yield game, state.clone()
+            state.apply_move(rng.choice(state.legal_moves()))
+
+
+def test_resolvers_discard_cards_in_hand_covering_the_damage():
+    checked = 0
+    for game, state in _discard_states():
+        cards = [game.card(card_id) for card_id in state.cur_player_hand().card_set()]
+        for name, resolver in DISCARD_RESOLVERS.items():
+            discard = resolver(cards, state.demage())
+            assert len(set(card.key() for card in discard)) == len(discard), name
+            assert all(card in cards for card in discard), name
+            assert sum(card.value() for card in discard) >= state.demage(), name
+            resolved = state.clone()
+            resolved.set_discard_resolver(name)
+            # The first discard move hands the rest of the phase to the resolver.
+            resolved.apply_move(resolved.get_move(game.num_cards() + discard[0].key()))
+            assert resolved.cur_state() != RegicideStateType.DISCARD
+        checked += 1
+    assert checked > 0
+
+
+def test_env_with_a_resolver_never_stops_in_the_discard_phase():
+    for name in DISCARD_RESOLVERS:
+        env = RegicideEnv(types.SimpleNamespace(regicide_name="Regicide-Single"), seed=1, discard_resolver=name)
+        rng = random.Random(1)
+        for _ in range(5):
+            env.reset()
+            done = False
+            while not done:
+                assert env.state.cur_state() != RegicideStateType.DISCARD
+                action = rng.choice(env.state.legal_moves_as_int())
+                done = env.step([action])[3]
+
+
+def _club_play(game, state):
+    """Returns the move id playing a single club below 10 and its card, or None."""
+    move_cards = game.legal_move_table()[0]
+    for action in state.legal_moves_as_int():
+        cards = [card for card in move_cards[action].tolist() if card < game.num_cards()]
+        if len(cards) == 1 and cards[0] // game.num_ranks() == 3 and game.card(cards[0]).value() < 10:
+            return action, game.card(cards[0])
+    return None
+
+
+def test_a_hand_not_above_the_damage_loses_at_once():
+    checked = 0
+    for seed in range(20):
+        game = RegicideGame(variant_config("Regicide-Single", seed))
+        state = game.new_initial_state()
+        play = _club_play(game, state)
+        if play is None:
+            continue
+        action, card = play
+        enemy = int(state._enemy_desk.ids()[0])
+        left = state.cur_player_hand().total_value() - card.value()
+        # The enemy survives the club and then attacks for the value left in hand, or one less.
+        for attack, result in ((left, RegicideStateType.LOSS), (left - 1, RegicideStateType.DISCARD)):
+            attacked = state.clone()
+            attacked._enemy_desk.set_health(enemy, 40)
+            attacked._enemy_desk.set_attack(enemy, attack)
+            batch = RegicideBatchState.from_states(game, [attacked], seed=seed)
+            attacked.apply_move(attacked.get_move(action))
+            batch.apply_moves([action])
+            assert attacked.cur_state() == result
+            assert batch.cur_state()[0] == result
+            assert batch.rewards()[0] == attacked._reward
+        checked += 1
+    assert checked > 0
@@ -0,0 +1,40 @@
+import random
+import types
+
+import numpy as np
+
+from regicide_env import RegicideEnv
+
+
+def _env(name, **kwargs):
+    return RegicideEnv(types.SimpleNamespace(regicide_name=name), **kwargs)
+
+
+def test_auto_advance_matches_manual_stepping():
+    for name in ("Regicide-Single", "Regicide-Double-Jacks"):
+        env = _env(name, seed=3, auto_advance=True)
+        rng = random.Random(3)
+        forced = 0
+        for _ in range(5):
+            _, _, available_actions = env.reset()
+            manual = env.state.clone()
+            done = False
+            while not done:
+                action = rng.choice(np.flatnonzero(available_actions).tolist())
+                _, _, reward, done, info, available_actions = env.step([action])
+                manual.apply_move(manual.get_move(action))
+                manual_reward = manual._reward
+                auto_steps = 0
+                while not manual.is_terminal():
+                    legal_moves = manual.legal_moves_as_int()
+                    if len(legal_moves) != 1:
+                        break
+                    manual.apply_move(manual.get_move(legal_moves[0]))
+                    manual_reward += manual._reward
+                    auto_steps += 1
+                assert info["auto_steps"] == auto_steps
+                assert reward == manual_reward
+                assert env.state.to_bytes() == manual.to_bytes()
+                assert done == manual.is_terminal()
+                forced += auto_steps
+        assert forced > 0, name
@@ -0,0 +1,33 @@
+import itertools
+import random
+
+from regicide import RegicideGame
+from regicide_variants import REGICIDE_VARIANTS, variant_config
+
+
+def _rehash(state):
+    zobrist = state._game.zobrist()
+    value = zobrist.ordered(zobrist.draw, state._desk.ids().tolist())
+    for card_id in state._discard_desk.ids().tolist():
+        value ^= zobrist.discard[card_id]
+    enemy_ids = state._enemy_desk.ids().tolist()
+    value ^= zobrist.ordered(zobrist.enemy, enemy_ids)
+    for card_id in enemy_ids:
+        value ^= zobrist.enemy_stats(card_id, state._enemy_desk.health(card_id), state._enemy_desk.attack(card_id))
+    for player, hand in enumerate(state._hands):
+        for card_id in hand.card_set():
+            value ^= zobrist.hand[player][card_id]
+    return (value ^ zobrist.scalar(1, state._demage) ^ zobrist.scalar(2, int(state._cur_state)) ^
+            zobrist.scalar(3, state._cur_player))
+
+
+def test_incremental_hash_matches_a_rehash():
+    for name, seed in itertools.product(REGICIDE_VARIANTS, range(3)):
+        game = RegicideGame(variant_config(name, seed))
+        state = game.new_initial_state()
+        rng = random.Random(seed)
+        while not state.is_terminal():
+            assert state.state_hash() == _rehash(state)
+            assert state.clone().state_hash() == state.state_hash()
+            state.apply_move(rng.choice(state.legal_moves()))
+        assert state.state_hash() == _rehash(state)
@@ -0,0 +1,46 @@
+import pytest
+
+from regicide import RegicideGame
+from regicide_mcts import RegicideMCTS
+from regicide_variants import variant_config
+
+
+def _state_without_ace_of_hearts():
+    for seed in range(100):
+        game = RegicideGame(variant_config("Regicide-Single", seed))
+        state = game.new_initial_state()
+        if 0 not in state.cur_player_hand().card_set():
+            return game, state
+    raise AssertionError("Every deal holds the ace of hearts.")
+
+
+def test_small_budget_selects_a_legal_move():
+    game, state = _state_without_ace_of_hearts()
+    agent = RegicideMCTS(game, determinizations=8, simulations=8, seed=0)
+    visits = agent.search(state)
+    assert visits.sum() == 8
+    assert not visits[~state.legal_action_mask()].any()
+    state.apply_move(state.get_move(agent.select_move(state)))
+
+
+def test_select_move_is_legal_without_visits():
+    game, state = _state_without_ace_of_hearts()
+    # Too few nodes to expand any root.
+    agent = RegicideMCTS(game, determinizations=8, simulations=8, max_nodes=8, seed=0)
+    assert agent.search(state).sum() == 0
+    assert state.legal_action_mask()[agent.select_move(state)]
+
+
+def test_workers_send_the_discard_resolver_by_name():
+    game, state = _state_without_ace_of_hearts()
+    state.set_discard_resolver("min_overkill")
+    agent = RegicideMCTS(game, determinizations=4, simulations=16, workers=2, seed=0)
+    try:
+        visits = agent.search(state)
+        assert visits.sum() == 16
+        assert not visits[~state.legal_action_mask()].any()
+        state.set_discard_resolver(lambda cards, demage: list(cards))
+        with pytest.raises(ValueError):
+            agent.search(state)
+    finally:
+        agent.close()
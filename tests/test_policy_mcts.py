@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+th = pytest.importorskip("torch")
+pytest.importorskip("sb3_contrib")
+from gymnasium import spaces
+from sb3_contrib.common.recurrent.type_aliases import RNNStates
+
+from common.policies import RecurrentMaskableActorCriticPolicy
+from regicide import RegicideGame
+from regicide_env import ObservationEncoder
+from regicide_policy_mcts import PolicyGuidedMCTS, evaluate_states
+from regicide_variants import variant_config
+
+
+def _policy(game, **kwargs):
+    size = ObservationEncoder(game).shape() + game.num_players()
+    return RecurrentMaskableActorCriticPolicy(
+        spaces.Box(0, 1, (size,), dtype=np.float32), spaces.Discrete(game.max_moves()), lambda _: 1e-3,
+        net_arch=[16], lstm_hidden_size=8, **kwargs)
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"enable_critic_lstm": False},
+                                    {"shared_lstm": True, "enable_critic_lstm": False}])
+def test_evaluate_states(kwargs):
+    game = RegicideGame(variant_config("Regicide-Single", 0))
+    policy = _policy(game, **kwargs)
+    n = 5
+    rng = np.random.default_rng(0)
+    observations = rng.random((n, policy.observation_space.shape[0]), dtype=np.float32)
+    masks = rng.random((n, game.max_moves())) < 0.1
+    masks[:, 0] = True
+    lstm_states = rng.standard_normal((4, 1, n, 8)).astype(np.float32)
+    priors, values, out = evaluate_states(policy, observations, masks, lstm_states, np.zeros(n, dtype=np.float32))
+    assert priors.shape == masks.shape
+    np.testing.assert_allclose(priors.sum(axis=1), 1, rtol=1e-5)
+    assert not priors[~masks].any()
+    assert values.shape == (n,)
+    assert out.shape == lstm_states.shape
+
+    states = th.as_tensor(lstm_states)
+    states = RNNStates((states[0], states[1]), (states[2], states[3]))
+    with th.no_grad():
+        _, expected, _, _ = policy.forward(th.as_tensor(observations), states, th.zeros(n), action_masks=masks)
+    np.testing.assert_allclose(values, expected.flatten().numpy(), rtol=1e-5)
+
+
+def test_search_visits_legal_moves():
+    game = RegicideGame(variant_config("Regicide-Single-Jacks", 0))
+    agent = PolicyGuidedMCTS(_policy(game), game, simulations=16, batch_size=8, determinizations=2, seed=0)
+    state = game.new_initial_state()
+    visits, lstm_states = agent.search(state, episode_start=True)
+    assert visits.sum() == 2 * 16
+    assert not visits[~state.legal_action_mask()].any()
+    assert lstm_states.shape == (4, 1, 1, 8)
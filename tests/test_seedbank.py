@@ -0,0 +1,87 @@
+import random
+import time
+import types
+
+import numpy as np
+
+from regicide import RegicideGame, RegicideState
+from regicide_env import RegicideEnv
+from regicide_seedbank import RegicideSeedBank
+from regicide_variants import REGICIDE_VARIANTS, variant_config
+
+
+def test_bank_states_match_the_dealt_states():
+    for name in REGICIDE_VARIANTS:
+        game = RegicideGame(variant_config(name, 0))
+        bank = RegicideSeedBank.generate(game, 5, seed=1)
+        bank.check(game)
+        for index in range(len(bank)):
+            state = bank.new_state(game, index)
+            dealt = RegicideState.from_deal(game, bank.draw[index], bank.enemies[index], int(bank.seeds[index]))
+            rng = random.Random(index)
+            while not dealt.is_terminal():
+                assert state.to_bytes() == dealt.to_bytes()
+                assert state.state_hash() == dealt.state_hash()
+                move = rng.choice(dealt.legal_moves())
+                state.apply_move(move)
+                dealt.apply_move(move)
+            assert state.is_terminal() and state.score() == dealt.score()
+
+
+def _resets_per_second(reset, count):
+    best = 0.0
+    for _ in range(3):
+        start = time.perf_counter()
+        for index in range(count):
+            reset(index)
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+def test_bank_reset_is_faster_than_a_new_deal():
+    game = RegicideGame(variant_config("Regicide-Double", 0))
+    bank = RegicideSeedBank.generate(game, 500, seed=1)
+    new_deal = _resets_per_second(lambda index: game.new_initial_state(), len(bank))
+    bank_reset = _resets_per_second(lambda index: bank.new_state(game, index), len(bank))
+    # The bank copies the packed piles and hashes, a new deal shuffles and rehashes.
+    assert bank_reset > 1.3 * new_deal, (bank_reset, new_deal)
+
+
+def _env(seed_bank, **kwargs):
+    return RegicideEnv(types.SimpleNamespace(regicide_name="Regicide-Double"), seed_bank=seed_bank, **kwargs)
+
+
+def _play(env, index, seed):
+    obs, _, available_actions = env.reset(index)
+    trace = [obs]
+    rng = random.Random(seed)
+    done = False
+    while not done:
+        action = rng.choice(np.flatnonzero(available_actions).tolist())
+        obs, _, reward, done, _, available_actions = env.step([action])
+        trace.append((obs, reward))
+    return trace
+
+
+def test_saved_bank_replays_the_same_deals(tmp_path):
+    game = RegicideGame(variant_config("Regicide-Double", 0))
+    bank = RegicideSeedBank.generate(game, 4, seed=2)
+    path = str(tmp_path / "bank.npz")
+    bank.save(path)
+    env = _env(bank)
+    reloaded = _env(path, seed=7)
+    for index in range(len(bank)):
+        assert _play(env, index, index) == _play(reloaded, index, index)
+
+
+def test_worker_shards_split_the_bank():
+    game = RegicideGame(variant_config("Regicide-Double", 0))
+    bank = RegicideSeedBank.generate(game, 10, seed=3)
+    deals = []
+    for worker in range(3):
+        env = _env(bank, worker=worker, num_workers=3)
+        for _ in range(len(env._seed_bank)):
+            env.reset()
+            deals.append(env.state.to_bytes())
+    assert len(set(deals)) == len(bank)
+    assert sorted(deals) == sorted(bank.new_state(game, index).to_bytes() for index in range(len(bank)))
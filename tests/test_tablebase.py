@@ -0,0 +1,29 @@
+import numpy as np
+
+from regicide import RegicideGame
+from regicide_tablebase import LOSS, RegicideTablebase
+from regicide_variants import variant_config
+
+
+def _endgame(game, hand_ids):
+    state = game.new_initial_state()
+    num_ranks = game.num_ranks()
+    state._enemy_desk.set_enemies(np.array([10]), np.array([4]), np.array([0]))
+    state._desk._set_ids(np.zeros(0, dtype=np.int8))
+    state._hands[0]._set_bits(sum(1 << (color * num_ranks + rank) for color, rank in hand_ids))
+    state._version += 1
+    return state
+
+
+def test_lookup_only_covers_positions_without_refills():
+    game = RegicideGame(variant_config("Regicide-Single-Jacks", 1))
+    tablebase = RegicideTablebase.build(game, max_enemies=1, max_hand=2)
+    # A 4 of spades kills the jack of hearts with 4 health left.
+    assert tablebase.lookup(_endgame(game, [(2, 3)])) == 1
+    assert tablebase.lookup(_endgame(game, [(2, 0)])) == LOSS
+    # A diamond could draw a card back into the hand.
+    assert tablebase.lookup(_endgame(game, [(1, 3)])) is None
+    state = _endgame(game, [(2, 3)])
+    state._desk._set_ids(np.array([0], dtype=np.int8))
+    assert tablebase.lookup(state) is None
+    assert tablebase.lookup(game.new_initial_state()) is None
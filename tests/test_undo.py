@@ -0,0 +1,26 @@
+import itertools
+import random
+
+from regicide import RegicideGame
+from regicide_variants import REGICIDE_VARIANTS, variant_config
+
+
+def _snapshot(state):
+    return state.state_hash(), state.to_bytes(), state.legal_action_mask().tolist()
+
+
+def test_undo_restores_every_state():
+    for name, seed in itertools.product(REGICIDE_VARIANTS, range(3)):
+        game = RegicideGame(variant_config(name, seed))
+        state = game.new_initial_state()
+        if seed == 2:
+            state.set_discard_resolver("min_overkill")
+        rng = random.Random(seed)
+        snapshots = []
+        records = []
+        while not state.is_terminal():
+            snapshots.append(_snapshot(state))
+            records.append(state.apply_move(rng.choice(state.legal_moves()), undo=True))
+        while records:
+            state.undo_move(records.pop())
+            assert _snapshot(state) == snapshots.pop()